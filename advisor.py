@@ -1,4 +1,9 @@
+import hashlib
 import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional
 from google import genai
 from config import get_settings
 
@@ -32,3 +37,103 @@ def user_chat(chat, user_message: str):
     """Send message to the Gemini chat session."""
     response = chat.send_message(user_message)
     return response.text
+
+def user_chat_stream(chat, user_message: str, cancel: Optional[threading.Event] = None) -> Iterator[str]:
+    """
+    Streams the reply to `user_message` as text chunks.
+    Stops early (dropping the rest of the reply) once `cancel` is set.
+    """
+    for chunk in chat.send_message_stream(user_message):
+        if cancel is not None and cancel.is_set():
+            break
+        if chunk.text:
+            yield chunk.text
+
+def analysis_version(analysis_json) -> str:
+    """Content hash of an analysis; a new version means the chat context is stale."""
+    blob = json.dumps(analysis_json, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+class ChatSession:
+    def __init__(self, chat, version: str):
+        self.chat = chat
+        self.version = version
+        self.last_used = time.monotonic()
+        # a Gemini chat keeps ordered history, so one message at a time per session
+        self.lock = threading.Lock()
+
+class ChatSessionPool:
+    """
+    Keeps one primed Gemini chat per user, so follow-up messages cost one round
+    trip and keep their history. A session is rebuilt only when the user's
+    analysis version changes; idle sessions expire and the pool is LRU-capped.
+    """
+    def __init__(self, max_sessions: int, idle_timeout: float):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _prune(self, now: float) -> None:
+        # caller holds the lock
+        stale = [uid for uid, s in self._sessions.items() if now - s.last_used > self.idle_timeout]
+        for uid in stale:
+            del self._sessions[uid]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def get(self, user_id: str, analysis_json) -> ChatSession:
+        version = analysis_version(analysis_json)
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            sess = self._sessions.get(user_id)
+            if sess is not None and sess.version == version:
+                sess.last_used = now
+                self._sessions.move_to_end(user_id)
+                self.reused += 1
+                return sess
+        # build outside the pool lock: priming the chat is an LLM round trip
+        sess = ChatSession(create_aqi_chat_agent(analysis_json), version)
+        with self._lock:
+            current = self._sessions.get(user_id)
+            if current is not None and current.version == version:
+                # another thread primed the same version meanwhile
+                current.last_used = now
+                return current
+            self._sessions[user_id] = sess
+            self._sessions.move_to_end(user_id)
+            self.created += 1
+            self._prune(now)
+        return sess
+
+    def send(self, user_id: str, analysis_json, user_message: str) -> str:
+        sess = self.get(user_id, analysis_json)
+        with sess.lock:
+            sess.last_used = time.monotonic()
+            return user_chat(sess.chat, user_message)
+
+    def stream(self, user_id: str, analysis_json, user_message: str,
+               cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        sess = self.get(user_id, analysis_json)
+        with sess.lock:
+            sess.last_used = time.monotonic()
+            yield from user_chat_stream(sess.chat, user_message, cancel)
+
+    def evict(self, user_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "idle_timeout": self.idle_timeout,
+                "created": self.created,
+                "reused": self.reused
+            }
+
+chat_pool = ChatSessionPool(settings.CHAT_POOL_MAX_SESSIONS, settings.CHAT_POOL_IDLE_TIMEOUT)
@@ -0,0 +1,198 @@
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+import db
+import geocoder
+import hourly_series
+from config import get_settings
+from forecaster import forecast_cache
+from geo_cache import location_key
+from location_index import get_index
+from schedule_windows import in_window, parse_windows
+
+settings = get_settings()
+AT_RISK_AGE_GROUPS = ("senior", "child")
+
+def _user_point(row: "db.AlertRow") -> Optional[Tuple[float, float]]:
+    """Home location without touching the network: "lat,lon", cached geocode, OpenAQ index, then route start."""
+    location = (row.location or "").strip()
+    if "," in location:
+        try:
+            lat, lon = [float(p) for p in location.split(",")]
+            return lat, lon
+        except ValueError:
+            pass
+    if location:
+        found, latlon = geocoder.cached(location)
+        if found and latlon:
+            return latlon
+        index = get_index()
+        loc_id = index.find_by_name(location)
+        if loc_id is not None and index.coords(loc_id):
+            return index.coords(loc_id)
+    if row.route_start_lat is not None and row.route_start_lng is not None:
+        return float(row.route_start_lat), float(row.route_start_lng)
+    return None
+
+class AlertEngine:
+    """
+    Periodic threshold-alert sweep.
+
+    Opted-in users are loaded once (reloaded every ALERT_USERS_REFRESH) into
+    flat arrays: cell index, personal threshold and alert flags. Each sweep
+    fetches the current AQI once per cell (shared hourly series) plus any cached
+    forecast peak, then decides every user in one vectorized pass. An alert is
+    raised when AQI reaches the threshold and cleared only once it falls
+    ALERT_HYSTERESIS below it, so values hovering at the line don't flap.
+    Only transitions are emitted, to the user's room; outside the commute
+    windows commute-only users keep their state but get no events.
+    """
+    def __init__(self, emit: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.emit = emit
+        self.interval = settings.ALERT_INTERVAL
+        self.commute_windows = parse_windows(settings.COMMUTE_WINDOWS)
+        self.last_sweep: Dict[str, Any] = {}
+        self._users: List[str] = []
+        self._cells: List[Tuple[float, float]] = []
+        self._cell_of = np.zeros(0, dtype=np.int64)
+        self._threshold = np.zeros(0)
+        self._threshold_alerts = np.zeros(0, dtype=bool)
+        self._commute_alerts = np.zeros(0, dtype=bool)
+        self._active = np.zeros(0, dtype=bool)
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def load(self, rows: Optional[List["db.AlertRow"]] = None) -> int:
+        """Rebuilds the per-user arrays; alert state carries over for users still opted in."""
+        rows = db.listAlertUsers() if rows is None else rows
+        previous = dict(zip(self._users, self._active.tolist()))
+        users, cell_of, thresholds, t_flags, c_flags = [], [], [], [], []
+        cells: List[Tuple[float, float]] = []
+        cell_pos: Dict[str, int] = {}
+        points: Dict[str, Optional[Tuple[float, float]]] = {}
+        for row in rows:
+            key = f"{row.location}|{row.route_start_lat}|{row.route_start_lng}"
+            if key not in points:
+                points[key] = _user_point(row)
+            point = points[key]
+            if point is None:
+                continue
+            cell = location_key(f"{point[0]},{point[1]}")
+            if cell not in cell_pos:
+                cell_pos[cell] = len(cells)
+                cells.append(point)
+            threshold = settings.ALERT_THRESHOLD_AQI
+            if row.is_sensitive:
+                threshold -= settings.ALERT_SENSITIVE_OFFSET
+            if row.age_group in AT_RISK_AGE_GROUPS:
+                threshold -= settings.ALERT_AGE_GROUP_OFFSET
+            users.append(row.username)
+            cell_of.append(cell_pos[cell])
+            thresholds.append(max(threshold, settings.ALERT_MIN_THRESHOLD))
+            t_flags.append(bool(row.threshold_alerts))
+            c_flags.append(bool(row.commute_alerts))
+        with self._lock:
+            self._users = users
+            self._cells = cells
+            self._cell_of = np.array(cell_of, dtype=np.int64)
+            self._threshold = np.array(thresholds, dtype=float)
+            self._threshold_alerts = np.array(t_flags, dtype=bool)
+            self._commute_alerts = np.array(c_flags, dtype=bool)
+            self._active = np.array([previous.get(u, False) for u in users], dtype=bool)
+            self._loaded_at = time.monotonic()
+        return len(users)
+
+    def cells(self) -> List[Tuple[float, float]]:
+        """One representative point per cell with opted-in users (loads users if needed)."""
+        if not self._users or time.monotonic() - self._loaded_at > settings.ALERT_USERS_REFRESH:
+            self.load()
+        with self._lock:
+            return list(self._cells)
+
+    @staticmethod
+    def _cell_levels(cells: List[Tuple[float, float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """(current AQI, forecast peak over ALERT_FORECAST_HOURS) per cell, NaN where unknown."""
+        n = len(cells)
+        current = np.full(n, np.nan)
+        peak = np.full(n, np.nan)
+        for i, now in enumerate(hourly_series.current_many("air_quality", cells)):
+            if now and now.get("us_aqi") is not None:
+                current[i] = now["us_aqi"]
+        for i, (lat, lon) in enumerate(cells):
+            found, fc = forecast_cache.get("forecast", location_key(f"{lat},{lon}"))
+            if found and fc and fc.get("aqi"):
+                peak[i] = max(fc["aqi"][:settings.ALERT_FORECAST_HOURS])
+        return current, peak
+
+    def sweep(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        started = time.perf_counter()
+        if not self._users or time.monotonic() - self._loaded_at > settings.ALERT_USERS_REFRESH:
+            self.load()
+        with self._lock:
+            users, cells, cell_of, threshold = self._users, self._cells, self._cell_of, self._threshold
+            eligible = self._threshold_alerts.copy()
+            if in_window(now or datetime.now(), self.commute_windows, 0):
+                eligible |= self._commute_alerts
+            active = self._active
+        if not users:
+            self.last_sweep = {"users": 0, "cells": 0, "raised": 0, "cleared": 0, "suppressed": 0, "seconds": 0.0}
+            return self.last_sweep
+
+        current, peak = self._cell_levels(cells)
+        cur_u = current[cell_of]
+        peak_u = peak[cell_of]
+        level = np.fmax(cur_u, peak_u)
+        known = ~np.isnan(level)
+        raise_mask = eligible & known & ~active & (level >= threshold)
+        clear_mask = active & known & (level < threshold - settings.ALERT_HYSTERESIS)
+        new_active = (active | raise_mask) & ~clear_mask
+
+        with self._lock:
+            if self._users is users:
+                self._active = new_active
+        raised = np.flatnonzero(raise_mask)
+        # an alert that clears while the user is out of their window is dropped silently
+        cleared = np.flatnonzero(clear_mask & eligible)
+        if self.emit is not None:
+            stamp = datetime.utcnow().isoformat()
+            for state, idx in (("raised", raised), ("cleared", cleared)):
+                for i in idx.tolist():
+                    self.emit(users[i], {
+                        "state": state,
+                        "aqi": None if np.isnan(cur_u[i]) else float(cur_u[i]),
+                        "forecastPeak": None if np.isnan(peak_u[i]) else float(peak_u[i]),
+                        "threshold": float(threshold[i]),
+                        "timestamp": stamp
+                    })
+        self.last_sweep = {
+            "users": len(users),
+            "cells": len(cells),
+            "raised": int(raised.size),
+            "cleared": int(cleared.size),
+            "suppressed": int(clear_mask.sum()) - int(cleared.size),
+            "active": int(new_active.sum()),
+            "seconds": time.perf_counter() - started
+        }
+        return self.last_sweep
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Alert sweep failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="alerts", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+engine = AlertEngine()
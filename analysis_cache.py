@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+from config import get_settings
+
+settings = get_settings()
+
+def _bucket(value, width):
+    if value is None:
+        return None
+    try:
+        return int(float(value) // width)
+    except (TypeError, ValueError):
+        return None
+
+def fingerprint(comp_fetch: Dict[str, Any]) -> str:
+    """
+    Canonical hash of a fetch_results() payload.
+    Volatile fields (route_id, raw weather, descriptors) are dropped and AQI /
+    temperature / humidity are bucketed, so effectively unchanged inputs share a key.
+    """
+    user = comp_fetch.get("user") or {}
+    current = comp_fetch.get("current") or {}
+    route = comp_fetch.get("route") or {}
+    weather = comp_fetch.get("weather") or current.get("current_weather") or {}
+    exposure = route.get("exposure") or {}
+    issues = user.get("health_issues")
+    if isinstance(issues, (list, tuple)):
+        issues = sorted(str(i).strip().lower() for i in issues)
+
+    aqi_w = settings.ANALYSIS_AQI_BUCKET
+    canonical = {
+        "user": {
+            "age": user.get("age"),
+            "health_issues": issues,
+            "residence": str(user.get("residence") or "").strip().lower(),
+        },
+        "aqi": _bucket(current.get("current_aqi"), aqi_w),
+        "route": {
+            "avg_aqi": _bucket(exposure.get("avg_aqi"), aqi_w),
+            "max_aqi": _bucket(exposure.get("max_aqi"), aqi_w),
+            "start": [round(float(route[k]), 3) for k in ("start_lat", "start_lon") if route.get(k) is not None],
+            "end": [round(float(route[k]), 3) for k in ("end_lat", "end_lon") if route.get(k) is not None],
+        },
+        "weather": {
+            "temp": _bucket(weather.get("temp"), settings.ANALYSIS_TEMP_BUCKET),
+            "humidity": _bucket(weather.get("humidity"), 10),
+        },
+    }
+    blob = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class AnalysisCache:
+    """
+    TTL + LRU cache of Gemini analyses keyed on fingerprint().
+    If `path` is set, entries are persisted as JSON (atomic rewrite on every put)
+    and reloaded on start so the cache survives restarts.
+    """
+    def __init__(self, ttl: float, max_entries: int, path: Optional[str] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = Path(path) if path else None
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, entry in sorted(raw.items(), key=lambda kv: kv[1].get("stored_at", 0)):
+            if entry.get("expires_at", 0) > now:
+                self._data[key] = entry
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def _save(self) -> None:
+        # caller holds the lock
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._data, f)
+        os.replace(tmp, self.path)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry["expires_at"] > time.time():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry["analysis"]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, analysis: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._data[key] = {"analysis": analysis, "stored_at": now, "expires_at": now + self.ttl}
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            if self.path:
+                try:
+                    self._save()
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "persistent": bool(self.path)
+            }
+
+analysis_cache = AnalysisCache(
+    ttl=settings.ANALYSIS_CACHE_TTL,
+    max_entries=settings.ANALYSIS_CACHE_MAX_ENTRIES,
+    path=settings.ANALYSIS_CACHE_PATH or None
+)
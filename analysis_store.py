@@ -0,0 +1,208 @@
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+from config import get_settings
+
+settings = get_settings()
+
+class AnalysisRecord(NamedTuple):
+    user_id: str
+    version: int
+    analysis: Dict[str, Any]
+    updated_at: float
+
+class FileBackend:
+    """
+    Append-only JSON-lines log, one record per line. Replayed on start (last
+    version per user wins) and rewritten compactly when mostly superseded.
+    """
+    shared = False
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lines = 0
+
+    def load_all(self) -> Dict[str, AnalysisRecord]:
+        latest: Dict[str, AnalysisRecord] = {}
+        self._lines = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = AnalysisRecord(**json.loads(line))
+                    except (ValueError, TypeError):
+                        continue
+                    self._lines += 1
+                    if rec.user_id not in latest or rec.version >= latest[rec.user_id].version:
+                        latest[rec.user_id] = rec
+        except OSError:
+            return {}
+        if self._lines > 2 * len(latest) + 100:
+            self._rewrite(list(latest.values()))
+        return latest
+
+    def load(self, user_id: str) -> Optional[AnalysisRecord]:
+        return None
+
+    def write(self, records: List[AnalysisRecord]) -> List[int]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec._asdict(), separators=(",", ":")) + "\n")
+        self._lines += len(records)
+        return [rec.version for rec in records]
+
+    def _rewrite(self, records: List[AnalysisRecord]) -> None:
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec._asdict(), separators=(",", ":")) + "\n")
+        os.replace(tmp, self.path)
+        self._lines = len(records)
+
+class MySQLBackend:
+    """
+    user_analysis table (JSON column); shared by every app process. Versions
+    are assigned by the database on write, so two processes never write the same one.
+    """
+    shared = True
+
+    def __init__(self):
+        import db
+        self.db = db
+        db.ensureAnalysisTable()
+
+    def load_all(self) -> Dict[str, AnalysisRecord]:
+        return {}
+
+    def load(self, user_id: str) -> Optional[AnalysisRecord]:
+        row = self.db.getAnalysis(user_id)
+        if row is None:
+            return None
+        username, version, analysis, updated_at = row
+        return AnalysisRecord(username, int(version), json.loads(analysis), float(updated_at))
+
+    def write(self, records: List[AnalysisRecord]) -> List[int]:
+        return [self.db.upsertAnalysis(rec.user_id, json.dumps(rec.analysis), rec.updated_at) for rec in records]
+
+class AnalysisStore:
+    """
+    Latest analysis per user with a per-user version number and timestamp.
+
+    Reads and writes hit the in-memory tier; persistence is write-behind: put()
+    marks the user dirty and a background thread flushes the newest record of
+    each dirty user every ANALYSIS_STORE_FLUSH_INTERVAL seconds. With a shared
+    backend (MySQL) misses and entries older than ANALYSIS_STORE_REVALIDATE are
+    re-read from it, so several app processes converge on the newest version;
+    there a record's version is provisional until its flush returns the one
+    the database assigned.
+    """
+    def __init__(self, backend, flush_interval: float, revalidate: float):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.revalidate = revalidate
+        self._records: Dict[str, AnalysisRecord] = backend.load_all()
+        self._checked: Dict[str, float] = {}
+        self._dirty: Dict[str, AnalysisRecord] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.writes = 0
+        self.flushes = 0
+        self.flush_errors = 0
+
+    def put(self, user_id: str, analysis: Dict[str, Any]) -> AnalysisRecord:
+        if self.backend.shared:
+            # pick up a version another process may have written
+            self.get(user_id)
+        with self._lock:
+            current = self._records.get(user_id)
+            record = AnalysisRecord(user_id, (current.version if current else 0) + 1, analysis, time.time())
+            self._records[user_id] = record
+            self._checked[user_id] = time.monotonic()
+            self._dirty[user_id] = record
+            self.writes += 1
+        self._ensure_writer()
+        return record
+
+    def get(self, user_id: str) -> Optional[AnalysisRecord]:
+        with self._lock:
+            record = self._records.get(user_id)
+            checked = self._checked.get(user_id, 0.0)
+        if not self.backend.shared or (record is not None and time.monotonic() - checked < self.revalidate):
+            return record
+        try:
+            stored = self.backend.load(user_id)
+        except Exception as e:
+            print(f"Analysis store read failed for {user_id}: {e}")
+            return record
+        with self._lock:
+            self._checked[user_id] = time.monotonic()
+            current = self._records.get(user_id)
+            if stored is not None and (current is None or stored.version > current.version):
+                self._records[user_id] = stored
+                current = stored
+            return current
+
+    def flush(self) -> int:
+        with self._lock:
+            batch = list(self._dirty.values())
+            self._dirty.clear()
+        if not batch:
+            return 0
+        try:
+            versions = self.backend.write(batch)
+        except Exception as e:
+            print(f"Analysis store flush failed: {e}")
+            with self._lock:
+                self.flush_errors += 1
+                for rec in batch:
+                    # keep anything newer that arrived meanwhile
+                    self._dirty.setdefault(rec.user_id, rec)
+            return 0
+        with self._lock:
+            self.flushes += 1
+            for rec, version in zip(batch, versions):
+                # adopt the version the backend assigned unless a newer put replaced the record
+                if version != rec.version and self._records.get(rec.user_id) is rec:
+                    self._records[rec.user_id] = rec._replace(version=version)
+        return len(batch)
+
+    def _loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _ensure_writer(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="analysis-store", daemon=True)
+                    self._thread.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "users": len(self._records),
+                "dirty": len(self._dirty),
+                "writes": self.writes,
+                "flushes": self.flushes,
+                "flush_errors": self.flush_errors,
+                "backend": type(self.backend).__name__
+            }
+
+def _make_backend():
+    if settings.ANALYSIS_STORE_BACKEND == "mysql":
+        return MySQLBackend()
+    return FileBackend(Path(settings.ANALYSIS_STORE_PATH))
+
+analysis_store = AnalysisStore(
+    _make_backend(),
+    flush_interval=settings.ANALYSIS_STORE_FLUSH_INTERVAL,
+    revalidate=settings.ANALYSIS_STORE_REVALIDATE
+)
+# don't lose the last write-behind batch on a clean shutdown
+atexit.register(analysis_store.flush)
@@ -2,13 +2,19 @@ from realtime_aqi import realtime_aqi
 from route_exposure import calculate_exposure
 from realtime_weather import realtime_weather
 from config import get_settings
+from analysis_cache import analysis_cache, fingerprint
+from analysis_store import analysis_store
+from prompt_builder import build_analysis_prompt, strip_schema
+from structured_output import StructuredOutput
+from singleflight import flights
+from exceptions import InvalidOutputError
+import http_client
 from google import genai
 from pathlib import Path
-from typing import Dict
-from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
 import uuid
 import json
-import jsonschema
 
 # NOTE THE USER INFORMATION IS TO BE INTEGRATED BY SOHAM
 # IMPORT FROM THE DATABASE AND PASS IT ONTO THE PARAMETERS IN THE FECTCH_RESULTS() FUCNTION
@@ -90,43 +96,101 @@ api_key = get_settings().GEMINI_API_KEY
 SCHEMA_PATH = Path(__file__).resolve().parent / "analysis_schema.json"
 with open(SCHEMA_PATH, "r") as f:
     SCHEMA = json.load(f)
-client = genai.Client(api_key=api_key)
+# bounded like every other upstream call, so coalesced waiters can derive their timeout from it
+_refresh_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="analysis-refresh")
+client = genai.Client(api_key=api_key, http_options={"timeout": int(http_client.PROVIDERS["gemini"]["timeout"] * 1000)})
+ANALYSIS_MODEL = "gemini-2.5-flash"
+# validator compiled once; invalid output is coerced locally, then re-asked at most ANALYSIS_MAX_REASKS times
+structured = StructuredOutput(SCHEMA, max_reasks=get_settings().ANALYSIS_MAX_REASKS)
+GENERATION_CONFIG = {"response_mime_type": "application/json"}
+if get_settings().ANALYSIS_NATIVE_SCHEMA:
+    GENERATION_CONFIG["response_json_schema"] = strip_schema(SCHEMA)
 
-def geminiForAnalysis(compFetch: Dict):
-    system_prompt = f"""
-    You are an AQI analysis agent. 
-    Based of the data (about the current AQI, Weather and User) provided,
-    analyse the situation carefuly,
-    Respond ONLY with valid JSON.
-    DO NOT write anything outside of the JSON object.
+def geminiForAnalysis(compFetch: Dict, use_cache: bool = True):
+    """
+    Runs the Gemini analysis for a fetch_results() payload.
+    Results are memoized on a bucketed fingerprint of the input, so repeat calls
+    with an effectively unchanged profile/AQI/weather skip the model round trip.
+    """
+    key = fingerprint(compFetch)
+    if use_cache:
+        cached = analysis_cache.get(key)
+        if cached is not None:
+            return cached
+    def run():
+        # with a native response schema the schema text stays out of the prompt
+        prompt_schema = None if "response_json_schema" in GENERATION_CONFIG else SCHEMA
+        system_prompt, size = build_analysis_prompt(compFetch, prompt_schema)
+        print(f"Analysis prompt: {size['chars']} chars, ~{size['tokens_est']} tokens "
+              f"(budget {size['budget']}, dropped {size['dropped'] or 'nothing'})")
+        response = client.models.generate_content(
+            model=ANALYSIS_MODEL,
+            contents=[system_prompt],
+            config=GENERATION_CONFIG
+        )
 
-    Schema:
-    {json.dumps(SCHEMA)}
+        def reask(previous: str, errors):
+            fix = (
+                "Your previous response did not match the required JSON schema.\n"
+                "Errors:\n" + "\n".join(f"- {e}" for e in errors) +
+                f"\nPrevious response:\n{previous}\n"
+                "Return the corrected JSON object only."
+            )
+            retry = client.models.generate_content(
+                model=ANALYSIS_MODEL,
+                contents=[system_prompt, fix],
+                config=GENERATION_CONFIG
+            )
+            return retry.text
 
-    Input:
-    {json.dumps(compFetch)}
-    """
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[system_prompt],
-        config={
-            "response_mime_type": "application/json"
-        }
-    )
-    analysis = json.loads(response.text)
-    jsonschema.validate(analysis, SCHEMA)
-    return analysis
+        analysis = structured.parse(response.text, reask=reask)
+        analysis_cache.put(key, analysis)
+        return analysis
 
-def save_analysis_to_file(user_id="default"):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"analysis_{user_id}.json"
-    compact_Fetch = fetch_results(user_data=USER_DATA, route=USER_ROUTE)
-    analysis = geminiForAnalysis(compact_Fetch)
-    path = Path(__file__).resolve().parent / "analysis_outputs"
-    path.mkdir(exist_ok=True)
+    # identical inputs arriving together share one model call
+    return flights.do("gemini_analysis", key, run, timeout=_gemini_bound())
+
+def _gemini_bound() -> float:
+    # the first call plus any re-asks, each bounded by the Gemini timeout
+    return (1 + structured.max_reasks) * http_client.PROVIDERS["gemini"]["timeout"] + 5
 
-    full_path = path / filename
+def _refresh_bound() -> float:
+    # fetch_results() (route deadline, WAQI, Open-Meteo with retries) followed by the model
+    return (get_settings().ROUTE_DEADLINE + http_client.max_call_time("waqi")
+            + http_client.max_call_time("open_meteo") + _gemini_bound())
 
-    with open(full_path, "w", encoding="utf-8") as f:
-        json.dump(analysis, f, indent=4)
-    return str(full_path)
\ No newline at end of file
+def refresh_analysis_async(user_id, on_done: Optional[Callable[[Any], None]] = None) -> "Future":
+    """
+    refresh_analysis() on a background worker; concurrent requests for the same
+    user share one run, and requests that reach a worker after an analysis was
+    stored use it instead of refreshing again. on_done gets the record (or the exception).
+    """
+    def run():
+        try:
+            result = analysis_store.get(user_id)
+            if result is None:
+                result = flights.do("analysis_refresh", user_id, lambda: refresh_analysis(user_id),
+                                    timeout=_refresh_bound())
+        except Exception as e:
+            result = e
+        if on_done is not None:
+            on_done(result)
+        return result
+    return _refresh_pool.submit(run)
+
+def refresh_analysis(user_id="default"):
+    """
+    Runs the analysis for the user and stores it as their newest version.
+    If the model's output can't be repaired, the last stored analysis is kept
+    and returned; InvalidOutputError only reaches users who never had one.
+    """
+    compact_Fetch = fetch_results(user_data=USER_DATA, route=USER_ROUTE)
+    try:
+        analysis = geminiForAnalysis(compact_Fetch)
+    except InvalidOutputError as e:
+        previous = analysis_store.get(user_id)
+        if previous is None:
+            raise
+        print(f"Analysis for {user_id} invalid, keeping version {previous.version}: {e}")
+        return previous
+    return analysis_store.put(user_id, analysis)
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from pathlib import Path
 import os
 import dotenv
 
@@ -9,6 +10,113 @@ class Settings:
     AQICN_TOKEN = os.getenv('WAQI_API_TOKEN',"")
     OPENAQ_TOKEN = os.getenv('OPENAQ_API_TOKEN')
     REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "8.0"))
+    # local on-disk caches and indexes
+    CACHE_DIR = os.getenv("CACHE_DIR", str(Path(__file__).resolve().parent / "cache"))
+    # OpenAQ history: page size, concurrent sensor fetches and row buffer between them
+    OPENAQ_PAGE_SIZE = int(os.getenv("OPENAQ_PAGE_SIZE", "1000"))
+    HISTORY_MAX_SENSOR_WORKERS = int(os.getenv("HISTORY_MAX_SENSOR_WORKERS", "4"))
+    HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "256"))
+    # local PM2.5 history store: size cap, retention and sensor-list TTL
+    HISTORY_STORE_MAX_MB = float(os.getenv("HISTORY_STORE_MAX_MB", "64"))
+    HISTORY_STORE_RETENTION_MONTHS = int(os.getenv("HISTORY_STORE_RETENTION_MONTHS", "60"))
+    HISTORY_SENSOR_TTL = float(os.getenv("HISTORY_SENSOR_TTL", str(7 * 24 * 3600)))
+    HISTORY_CURRENT_TTL = float(os.getenv("HISTORY_CURRENT_TTL", "3600"))
+    # empty months closed less than this many days ago are re-fetched once their row is HISTORY_EMPTY_TTL old
+    HISTORY_EMPTY_RECHECK_DAYS = float(os.getenv("HISTORY_EMPTY_RECHECK_DAYS", "45"))
+    HISTORY_EMPTY_TTL = float(os.getenv("HISTORY_EMPTY_TTL", "86400"))
+    # OpenAQ location index: refresh after this many seconds
+    LOCATION_INDEX_MAX_AGE = float(os.getenv("LOCATION_INDEX_MAX_AGE", str(7 * 24 * 3600)))
+    # local AQI forecaster: persisted model and per-cell forecast cache TTL
+    FORECAST_MODEL_PATH = os.getenv("FORECAST_MODEL_PATH", str(Path(CACHE_DIR) / "aqi_forecaster.joblib"))
+    FORECAST_CACHE_TTL = float(os.getenv("FORECAST_CACHE_TTL", "3600"))
+    # how often the precompute scheduler re-forecasts the cells of alert users (0 disables)
+    FORECAST_PREWARM_INTERVAL = float(os.getenv("FORECAST_PREWARM_INTERVAL", "900"))
+    # route exposure sampling: max concurrent WAQI calls and overall deadline (seconds)
+    ROUTE_MAX_IN_FLIGHT = int(os.getenv("ROUTE_MAX_IN_FLIGHT", "6"))
+    ROUTE_DEADLINE = float(os.getenv("ROUTE_DEADLINE", "10.0"))
+    # route dose integration: default travel mode and the AQI counted as "above threshold"
+    ROUTE_TRAVEL_MODE = os.getenv("ROUTE_TRAVEL_MODE", "car")
+    EXPOSURE_THRESHOLD_AQI = float(os.getenv("EXPOSURE_THRESHOLD_AQI", "100"))
+    # adaptive corridor sampling for routes with more than ROUTE_ADAPTIVE_MIN_POINTS vertices
+    ROUTE_ADAPTIVE_MIN_POINTS = int(os.getenv("ROUTE_ADAPTIVE_MIN_POINTS", "20"))
+    ROUTE_SAMPLE_TOLERANCE = float(os.getenv("ROUTE_SAMPLE_TOLERANCE", "15"))
+    ROUTE_SAMPLE_MIN_SPACING_M = float(os.getenv("ROUTE_SAMPLE_MIN_SPACING_M", "500"))
+    ROUTE_SAMPLE_INITIAL_SPACING_M = float(os.getenv("ROUTE_SAMPLE_INITIAL_SPACING_M", "3000"))
+    # realtime AQI cache: geohash precision of a cell, TTL (WAQI updates hourly) and LRU cap
+    GEO_CACHE_PRECISION = int(os.getenv("GEO_CACHE_PRECISION", "6"))
+    GEO_CACHE_TTL = float(os.getenv("GEO_CACHE_TTL", "3600"))
+    GEO_CACHE_MAX_ENTRIES = int(os.getenv("GEO_CACHE_MAX_ENTRIES", "5000"))
+    # offline reverse geocoding: bundled places file, max distance to a place and the remote-lookup cache
+    GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", str(Path(__file__).resolve().parent / "data" / "places.csv"))
+    GAZETTEER_MAX_DISTANCE_KM = float(os.getenv("GAZETTEER_MAX_DISTANCE_KM", "25"))
+    GAZETTEER_REMOTE_TTL = float(os.getenv("GAZETTEER_REMOTE_TTL", "604800"))
+    GAZETTEER_REMOTE_MAX_ENTRIES = int(os.getenv("GAZETTEER_REMOTE_MAX_ENTRIES", "2000"))
+    # forward geocoding (onboarding routes): persistent cache, shared Nominatim rate limit and async mode
+    GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", str(Path(CACHE_DIR) / "geocode.json"))
+    GEOCODE_NEGATIVE_TTL = float(os.getenv("GEOCODE_NEGATIVE_TTL", "86400"))
+    GEOCODE_RATE_PER_SEC = float(os.getenv("GEOCODE_RATE_PER_SEC", "1"))
+    GEOCODE_BURST = float(os.getenv("GEOCODE_BURST", "1"))
+    GEOCODE_WAIT_TIMEOUT = float(os.getenv("GEOCODE_WAIT_TIMEOUT", "5"))
+    ONBOARDING_ASYNC_GEOCODE = os.getenv("ONBOARDING_ASYNC_GEOCODE", "1") == "1"
+    # Open-Meteo hourly series cache: TTL and hours kept ahead of now
+    HOURLY_SERIES_TTL = float(os.getenv("HOURLY_SERIES_TTL", "3600"))
+    HOURLY_SERIES_FORECAST_HOURS = int(os.getenv("HOURLY_SERIES_FORECAST_HOURS", "3"))
+    # per-cell Socket.IO rooms: how often active cells are refreshed and diffed
+    LIVE_CELL_INTERVAL = float(os.getenv("LIVE_CELL_INTERVAL", "60"))
+    # /api/aqi/batch: max points per request and coordinates per Open-Meteo call
+    AQI_BATCH_MAX_POINTS = int(os.getenv("AQI_BATCH_MAX_POINTS", "1000"))
+    AQI_BATCH_CHUNK = int(os.getenv("AQI_BATCH_CHUNK", "100"))
+    # shared upstream HTTP client: per-host pool size, retries and circuit breaker
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+    HTTP_BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", "0.25"))
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30.0"))
+    # longest a coalesced caller waits on another caller's fetch when no provider bound is given
+    SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "60"))
+    # Gemini analysis memoization: TTL, LRU cap, optional JSON persistence file and input buckets
+    ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", "1800"))
+    ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "500"))
+    ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", "")
+    # estimated input-token budget for the analysis prompt; optional fields are trimmed above it
+    ANALYSIS_PROMPT_TOKEN_BUDGET = int(os.getenv("ANALYSIS_PROMPT_TOKEN_BUDGET", "1200"))
+    # pass the analysis schema as the model's response schema; re-asks allowed after local repair fails
+    ANALYSIS_NATIVE_SCHEMA = os.getenv("ANALYSIS_NATIVE_SCHEMA", "1") == "1"
+    ANALYSIS_MAX_REASKS = int(os.getenv("ANALYSIS_MAX_REASKS", "1"))
+    # latest analysis per user: "file" (append-only log) or "mysql", write-behind interval,
+    # and how often a shared (mysql) backend is re-checked for newer versions
+    ANALYSIS_STORE_BACKEND = os.getenv("ANALYSIS_STORE_BACKEND", "file")
+    ANALYSIS_STORE_PATH = os.getenv("ANALYSIS_STORE_PATH", str(Path(CACHE_DIR) / "analyses.jsonl"))
+    ANALYSIS_STORE_FLUSH_INTERVAL = float(os.getenv("ANALYSIS_STORE_FLUSH_INTERVAL", "2"))
+    ANALYSIS_STORE_REVALIDATE = float(os.getenv("ANALYSIS_STORE_REVALIDATE", "30"))
+    ANALYSIS_AQI_BUCKET = int(os.getenv("ANALYSIS_AQI_BUCKET", "25"))
+    ANALYSIS_TEMP_BUCKET = float(os.getenv("ANALYSIS_TEMP_BUCKET", "3.0"))
+    # advisor chat sessions kept per user: pool size and idle timeout (seconds)
+    CHAT_POOL_MAX_SESSIONS = int(os.getenv("CHAT_POOL_MAX_SESSIONS", "200"))
+    CHAT_POOL_IDLE_TIMEOUT = float(os.getenv("CHAT_POOL_IDLE_TIMEOUT", "1800"))
+    # stream assistant replies as assistant_delta/assistant_done unless the client says otherwise
+    CHAT_STREAMING = os.getenv("CHAT_STREAMING", "0") == "1"
+    # route-exposure precomputation: sweep interval, result max age, workers and active windows
+    PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "1") == "1"
+    PRECOMPUTE_INTERVAL = float(os.getenv("PRECOMPUTE_INTERVAL", "300"))
+    PRECOMPUTE_MAX_AGE = float(os.getenv("PRECOMPUTE_MAX_AGE", "1800"))
+    PRECOMPUTE_WORKERS = int(os.getenv("PRECOMPUTE_WORKERS", "2"))
+    PRECOMPUTE_LEAD_MINUTES = int(os.getenv("PRECOMPUTE_LEAD_MINUTES", "30"))
+    COMMUTE_WINDOWS = os.getenv("COMMUTE_WINDOWS", "07:00-10:00,17:00-20:00")
+    MORNING_SUMMARY_WINDOW = os.getenv("MORNING_SUMMARY_WINDOW", "06:00-09:00")
+    # threshold alerts: sweep interval, user reload interval, AQI thresholds (lowered for
+    # sensitive users and for the at-risk age groups, seniors and children), hysteresis band
+    # and forecast look-ahead
+    ALERTS_ENABLED = os.getenv("ALERTS_ENABLED", "1") == "1"
+    ALERT_INTERVAL = float(os.getenv("ALERT_INTERVAL", "300"))
+    ALERT_USERS_REFRESH = float(os.getenv("ALERT_USERS_REFRESH", "900"))
+    ALERT_THRESHOLD_AQI = float(os.getenv("ALERT_THRESHOLD_AQI", "150"))
+    ALERT_SENSITIVE_OFFSET = float(os.getenv("ALERT_SENSITIVE_OFFSET", "50"))
+    # ALERT_SENIOR_OFFSET is the old name of ALERT_AGE_GROUP_OFFSET and still read as a fallback
+    ALERT_AGE_GROUP_OFFSET = float(os.getenv("ALERT_AGE_GROUP_OFFSET", os.getenv("ALERT_SENIOR_OFFSET", "25")))
+    ALERT_MIN_THRESHOLD = float(os.getenv("ALERT_MIN_THRESHOLD", "50"))
+    ALERT_HYSTERESIS = float(os.getenv("ALERT_HYSTERESIS", "15"))
+    ALERT_FORECAST_HOURS = int(os.getenv("ALERT_FORECAST_HOURS", "6"))
 @lru_cache
 def get_settings():
     return Settings()
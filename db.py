@@ -1,34 +1,112 @@
 import mysql.connector
+from mysql.connector import pooling
 import os
+import threading
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
 import dotenv
+from green import patched
 dotenv.load_dotenv()
 host = os.getenv("DATABASE_HOST")
 user = os.getenv("DATABASE_USER")
 password = os.getenv("DATABASE_PASSWORD")
 database = os.getenv("DATABASE_NAME")
+pool_size = int(os.getenv("DATABASE_POOL_SIZE", "8"))
+# the C extension blocks the whole process under eventlet; the pure-Python driver yields
+use_pure = patched()
 try:
-    mydb = mysql.connector.connect(
+    pool = pooling.MySQLConnectionPool(
+        pool_name="airware",
+        pool_size=pool_size,
         host=host,
         user=user,
         password=password,
-        database=database
+        database=database,
+        use_pure=use_pure
     )
-
-    
-    cursor = mydb.cursor()
-
 except :
     print("Database connection error")
     raise
+# mysql-connector's pool raises instead of waiting when exhausted, so callers queue here
+_slots = threading.BoundedSemaphore(pool_size)
+USER_FIELDS = ("username", "email")
+
+class UserRow(NamedTuple):
+    username: str
+    email: str
+    first_name: Optional[str]
+    last_name: Optional[str]
+    password: Optional[str]
+    age_group: Optional[str]
+    is_sensitive: Optional[int]
+    location: Optional[str]
+    route_start_lat: Optional[float]
+    route_start_lng: Optional[float]
+    route_end_lat: Optional[float]
+    route_end_lng: Optional[float]
+
+class ScheduleRow(NamedTuple):
+    username: str
+    morning_summary: int
+    commute_alerts: int
+
+class AlertRow(NamedTuple):
+    username: str
+    age_group: Optional[str]
+    is_sensitive: Optional[int]
+    location: Optional[str]
+    route_start_lat: Optional[float]
+    route_start_lng: Optional[float]
+    threshold_alerts: int
+    commute_alerts: int
+
+USER_COLUMNS = ", ".join(UserRow._fields)
+
+@contextmanager
+def get_cursor(prepared=True):
+    """
+    Borrows a pooled connection (reviving it if the server dropped it) and
+    yields a fresh cursor; the connection goes back to the pool afterwards.
+    """
+    with _slots:
+        conn = pool.get_connection()
+        try:
+            conn.ping(reconnect=True, attempts=2, delay=0)
+            cur = conn.cursor(prepared=prepared)
+            try:
+                yield conn, cur
+            finally:
+                cur.close()
+        finally:
+            conn.close()
+
+def _execute(sql, params=(), fetch=False, commit=False, prepared=True, idempotent=None):
+    # one retry on a connection that died between ping and execute; writes are only
+    # retried when marked idempotent, since a lost ack may mean the first one applied
+    if idempotent is None:
+        idempotent = not commit
+    for attempt in range(2 if idempotent else 1):
+        try:
+            with get_cursor(prepared=prepared) as (conn, cur):
+                cur.execute(sql, params)
+                rows = cur.fetchall() if fetch else None
+                if commit:
+                    conn.commit()
+                return rows
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            if attempt == 1 or not idempotent:
+                raise
+
 def config():
     dbList = []
-    cursor.execute('SHOW DATABASES')
-    for x in cursor:
-        dbList.append(x[0])
-        if "CAPSTONE" not in dbList:
-            cursor.execute("CREATE DATABASE CAPSTONE")
-            cursor.execute("USE CAPSTONE")
-            cursor.execute("""CREATE TABLE users (
+    with get_cursor(prepared=False) as (conn, cursor):
+        cursor.execute('SHOW DATABASES')
+        for x in cursor.fetchall():
+            dbList.append(x[0])
+            if "CAPSTONE" not in dbList:
+                cursor.execute("CREATE DATABASE CAPSTONE")
+                cursor.execute("USE CAPSTONE")
+                cursor.execute("""CREATE TABLE users (
     id INT NOT NULL AUTO_INCREMENT,
     username VARCHAR(50) NOT NULL,
     email VARCHAR(150) NOT NULL,
@@ -49,6 +127,7 @@ def config():
     threshold_alerts TINYINT(1) NULL DEFAULT 0,
     commute_alerts TINYINT(1) NULL DEFAULT 0,
     enable_notifications TINYINT(1) NULL DEFAULT 1,
+    route_token CHAR(32) NULL,
 
     PRIMARY KEY (id),
     UNIQUE KEY (email)
@@ -57,11 +136,31 @@ def config():
 
 
 def showField(field, value):
-    global cursor
-    sql = "SELECT username, email, first_name, last_name, password, age_group, is_sensitive, location, route_start_lat, route_start_lng, route_end_lat, route_end_lng  FROM users WHERE " + field + "='" + value + "';"
-    cursor.execute(sql)
-    valuelist = cursor.fetchall()
-    return valuelist
+    if field not in USER_FIELDS:
+        raise ValueError(f"Cannot look users up by '{field}'")
+    sql = f"SELECT {USER_COLUMNS} FROM users WHERE {field}=%s"
+    rows = _execute(sql, (value,), fetch=True)
+    return [UserRow(*row) for row in rows]
+def listScheduledUsers():
+    sql = """
+        SELECT username, morning_summary, commute_alerts
+        FROM users
+        WHERE morning_summary=1 OR commute_alerts=1
+    """
+    rows = _execute(sql, fetch=True)
+    return [ScheduleRow(*row) for row in rows]
+def listAlertUsers():
+    sql = f"""
+        SELECT {", ".join(AlertRow._fields)}
+        FROM users
+        WHERE enable_notifications=1 AND (threshold_alerts=1 OR commute_alerts=1)
+    """
+    rows = _execute(sql, fetch=True)
+    return [AlertRow(*row) for row in rows]
+def listUserLocations():
+    sql = "SELECT DISTINCT location FROM users WHERE location IS NOT NULL AND location<>''"
+    rows = _execute(sql, fetch=True)
+    return [row[0] for row in rows]
 def signupInsert(username, email, password, fname, lname):
     sql = """
         INSERT INTO users (username, email, password, first_name, last_name)
@@ -69,12 +168,11 @@ def signupInsert(username, email, password, fname, lname):
     """
     val = (username, email, password, fname, lname)
 
-    cursor.execute(sql, val)
-    mydb.commit()
+    _execute(sql, val, commit=True)
 def updateOnboarding(user_id, location, age_group, is_sensitive,
                      morning_summary, threshold_alerts, commute_alerts,
-                     enable_notifications, route_start_lat, route_start_lng, 
-           route_end_lat, route_end_lng):
+                     enable_notifications, route_start_lat, route_start_lng,
+           route_end_lat, route_end_lng, route_token=None):
 
     sql = """
     UPDATE users
@@ -86,21 +184,85 @@ def updateOnboarding(user_id, location, age_group, is_sensitive,
         commute_alerts=%s,
         enable_notifications=%s,
         route_start_lat=%s,
-        route_start_lng=%s ,     
+        route_start_lng=%s ,
         route_end_lat=%s,
-        route_end_lng=%s 
+        route_end_lng=%s,
+        route_token=%s
     WHERE username=%s
     """
 
     val = (location, age_group, is_sensitive,
            morning_summary, threshold_alerts,
            commute_alerts, enable_notifications,
-           route_start_lat, route_start_lng, 
+           route_start_lat, route_start_lng,
            route_end_lat, route_end_lng,
-           user_id)
+           route_token, user_id)
     print("start lat:", route_start_lat, type(route_start_lat))
     print("start lng:", route_start_lng, type(route_start_lng))
 
-    cursor.execute(sql, val)
-    mydb.commit()
-
+    _execute(sql, val, commit=True, idempotent=True)
+def ensureRouteTokenColumn():
+    # tables created before the queued route geocoding lack the column
+    sql = """
+    SELECT COUNT(*) FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME='users' AND COLUMN_NAME='route_token'
+    """
+    if not _execute(sql, fetch=True)[0][0]:
+        _execute("ALTER TABLE users ADD COLUMN route_token CHAR(32) NULL", commit=True, prepared=False)
+def ensureAnalysisTable():
+    sql = """
+    CREATE TABLE IF NOT EXISTS user_analysis (
+        username VARCHAR(50) NOT NULL,
+        version INT NOT NULL,
+        analysis JSON NOT NULL,
+        updated_at DOUBLE NOT NULL,
+        PRIMARY KEY (username)
+    )
+    """
+    _execute(sql, commit=True, prepared=False, idempotent=True)
+def getAnalysis(user_id):
+    sql = "SELECT username, version, analysis, updated_at FROM user_analysis WHERE username=%s"
+    rows = _execute(sql, (user_id,), fetch=True)
+    return rows[0] if rows else None
+def upsertAnalysis(user_id, analysis_json, updated_at):
+    """
+    Stores the user's analysis; the database assigns the version (previous + 1)
+    so concurrent writers never reuse one. Returns the new version.
+    Not retried on connection errors: a lost ack may mean it already applied.
+    """
+    sql = """
+    INSERT INTO user_analysis (username, version, analysis, updated_at)
+    VALUES (%s, 1, %s, %s)
+    ON DUPLICATE KEY UPDATE version=version + 1, analysis=VALUES(analysis), updated_at=VALUES(updated_at)
+    """
+    with get_cursor() as (conn, cur):
+        cur.execute(sql, (user_id, analysis_json, updated_at))
+        # the row stays locked by this transaction until commit, so this is our version
+        cur.execute("SELECT version FROM user_analysis WHERE username=%s", (user_id,))
+        version = cur.fetchall()[0][0]
+        conn.commit()
+    return int(version)
+def updateRouteCoords(user_id, route_start_lat, route_start_lng,
+                      route_end_lat, route_end_lng, route_token):
+    """
+    Fills in route coordinates geocoded after onboarding, only while the row
+    still carries the onboarding's `route_token` (a newer onboarding replaced
+    it otherwise). The token is cleared, so a matching row always counts as
+    changed. Returns whether the row was updated.
+    Not retried on connection errors: a lost ack would read as stale.
+    """
+    sql = """
+    UPDATE users
+    SET route_start_lat=%s,
+        route_start_lng=%s,
+        route_end_lat=%s,
+        route_end_lng=%s,
+        route_token=NULL
+    WHERE username=%s AND route_token=%s
+    """
+    val = (route_start_lat, route_start_lng, route_end_lat, route_end_lng, user_id, route_token)
+    with get_cursor() as (conn, cur):
+        cur.execute(sql, val)
+        updated = cur.rowcount > 0
+        conn.commit()
+    return updated
@@ -1,3 +1,19 @@
 class FetchError(Exception):
     """Raised when a fetch/wrapper operation fails in a controlled way."""
-    pass
\ No newline at end of file
+    pass
+
+class CircuitOpenError(FetchError):
+    """Raised when an upstream provider's circuit breaker is open and calls fail fast."""
+    pass
+
+class NotFoundError(FetchError):
+    """Raised when an upstream lookup succeeded but found nothing (e.g. an unknown place)."""
+    pass
+
+class FlightTimeoutError(FetchError):
+    """Raised when a coalesced call's leader doesn't finish within the waiter's timeout."""
+    pass
+
+class InvalidOutputError(FetchError):
+    """Raised when a model's output still fails schema validation after repair."""
+    pass
@@ -0,0 +1,131 @@
+from typing import Any, Dict, Optional, Sequence
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_M = 6371008.8
+# typical door-to-door speeds in Indian cities (km/h)
+TRAVEL_SPEEDS_KMH = {
+    "walk": 5.0,
+    "cycle": 14.0,
+    "bus": 18.0,
+    "car": 25.0,
+    "metro": 35.0,
+}
+# US EPA PM2.5 breakpoints as used by WAQI: AQI -> concentration (µg/m³), piecewise linear
+_AQI_BREAKS = np.array([0, 50, 51, 100, 101, 150, 151, 200, 201, 300, 301, 400, 401, 500], dtype=float)
+_PM25_BREAKS = np.array([0.0, 12.0, 12.1, 35.4, 35.5, 55.4, 55.5, 150.4, 150.5, 250.4, 250.5, 350.4, 350.5, 500.4])
+
+def aqi_to_pm25(aqi) -> np.ndarray:
+    """Inverts the US AQI scale to PM2.5 µg/m³ (values above 500 are extrapolated linearly)."""
+    aqi = np.asarray(aqi, dtype=float)
+    conc = np.interp(aqi, _AQI_BREAKS, _PM25_BREAKS)
+    over = aqi > _AQI_BREAKS[-1]
+    if np.any(over):
+        conc[over] = _PM25_BREAKS[-1] + (aqi[over] - _AQI_BREAKS[-1]) * 0.5
+    return conc
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in metres; all arguments broadcast."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=float)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _nearest_vertex(lats: np.ndarray, lons: np.ndarray, s_lats: np.ndarray, s_lons: np.ndarray) -> np.ndarray:
+    # equirectangular coordinates are enough to pick the closest vertex
+    coslat = np.cos(np.radians(lats.mean()))
+    tree = cKDTree(np.column_stack((lats, lons * coslat)))
+    _, idx = tree.query(np.column_stack((s_lats, s_lons * coslat)))
+    return idx
+
+def integrate_exposure(lats: Sequence[float], lons: Sequence[float],
+                       sample_lats: Sequence[float], sample_lons: Sequence[float],
+                       sample_aqi: Sequence[float], mode: str = "car",
+                       speed_kmh: Optional[float] = None,
+                       threshold_aqi: float = 100.0) -> Dict[str, Any]:
+    """
+    Integrates PM2.5 exposure along a polyline.
+
+    - lats/lons: route vertices in travel order
+    - sample_*: AQI readings; each is snapped to its nearest vertex and the
+      concentration is linearly interpolated by distance between samples
+    - mode/speed_kmh: travel speed used to turn segment length into time
+    Returns:
+      {
+        "distance_km": float,
+        "duration_min": float,
+        "dose": float,                 # PM2.5 concentration x time, ug·hr/m3
+        "mean_pm25": float,            # time-weighted µg/m³
+        "time_weighted_aqi": float,
+        "peak_segment": {"index", "aqi", "pm25", "lat", "lon"},
+        "time_above_threshold_min": float,
+        "threshold_aqi": float
+      }
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    s_lats = np.asarray(sample_lats, dtype=float)
+    s_lons = np.asarray(sample_lons, dtype=float)
+    s_aqi = np.asarray(sample_aqi, dtype=float)
+    if lats.size == 0 or s_aqi.size == 0:
+        raise ValueError("integrate_exposure needs at least one vertex and one sample")
+    if speed_kmh is None:
+        speed_kmh = TRAVEL_SPEEDS_KMH.get(mode, TRAVEL_SPEEDS_KMH["car"])
+
+    seg_m = haversine_m(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    cum_m = np.concatenate(([0.0], np.cumsum(seg_m)))
+
+    # place samples along the route and interpolate AQI at every vertex
+    s_pos = cum_m[_nearest_vertex(lats, lons, s_lats, s_lons)]
+    order = np.argsort(s_pos, kind="stable")
+    s_pos, s_aqi = s_pos[order], s_aqi[order]
+    # samples snapped to the same vertex are averaged
+    uniq_pos, inverse = np.unique(s_pos, return_inverse=True)
+    uniq_aqi = np.bincount(inverse, weights=s_aqi) / np.bincount(inverse)
+    vertex_aqi = np.interp(cum_m, uniq_pos, uniq_aqi)
+
+    if seg_m.size == 0 or cum_m[-1] == 0.0:
+        aqi0 = float(vertex_aqi[0])
+        return {
+            "distance_km": 0.0,
+            "duration_min": 0.0,
+            "dose": 0.0,
+            "mean_pm25": float(aqi_to_pm25(aqi0)),
+            "time_weighted_aqi": aqi0,
+            "peak_segment": {"index": 0, "aqi": aqi0, "pm25": float(aqi_to_pm25(aqi0)),
+                             "lat": float(lats[0]), "lon": float(lons[0])},
+            "time_above_threshold_min": 0.0,
+            "threshold_aqi": threshold_aqi
+        }
+
+    seg_hr = seg_m / 1000.0 / speed_kmh
+    a, b = vertex_aqi[:-1], vertex_aqi[1:]
+    seg_aqi = (a + b) / 2
+    # trapezoid on concentration (the AQI -> PM2.5 map is non-linear, so convert first)
+    vertex_pm = aqi_to_pm25(vertex_aqi)
+    seg_pm = (vertex_pm[:-1] + vertex_pm[1:]) / 2
+    duration_hr = float(seg_hr.sum())
+    dose = float(np.dot(seg_pm, seg_hr))
+
+    # share of each segment at or above the threshold (as the alert engine counts it),
+    # assuming linear AQI within it; a segment starting at the threshold counts fully, flat or not
+    hi, lo = np.maximum(a, b), np.minimum(a, b)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    frac_above = np.where(lo >= threshold_aqi, 1.0, np.clip((hi - threshold_aqi) / span, 0.0, 1.0))
+
+    peak = int(np.argmax(seg_aqi))
+    return {
+        "distance_km": float(cum_m[-1] / 1000.0),
+        "duration_min": duration_hr * 60.0,
+        "dose": dose,
+        "mean_pm25": dose / duration_hr,
+        "time_weighted_aqi": float(np.dot(seg_aqi, seg_hr) / duration_hr),
+        "peak_segment": {
+            "index": peak,
+            "aqi": float(seg_aqi[peak]),
+            "pm25": float(seg_pm[peak]),
+            "lat": float((lats[peak] + lats[peak + 1]) / 2),
+            "lon": float((lons[peak] + lons[peak + 1]) / 2)
+        },
+        "time_above_threshold_min": float(np.dot(frac_above, seg_hr) * 60.0),
+        "threshold_aqi": threshold_aqi
+    }
@@ -0,0 +1,263 @@
+import sys
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import joblib
+import numpy as np
+import http_client
+from config import get_settings
+from exceptions import FetchError
+from geo_cache import GeoTTLCache, location_key
+from green import run_blocking
+from history_aqi import stored_monthly_pm25, _resolve_location_id
+from location_index import get_index
+
+settings = get_settings()
+HORIZON_HOURS = 24
+WEATHER_VARS = ["temperature_2m", "relativehumidity_2m", "windspeed_10m"]
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+AIR_QUALITY_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
+FEATURES = [
+    "current_aqi", "prev_month_pm25", "horizon",
+    "hour_sin", "hour_cos", "dow", "month_sin", "month_cos",
+    "temp", "humidity", "wind"
+]
+
+def _features(current_aqi: np.ndarray, baseline: np.ndarray, target_times: np.ndarray,
+              temp: np.ndarray, humidity: np.ndarray, wind: np.ndarray) -> np.ndarray:
+    """
+    Builds the (n_locations * HORIZON_HOURS, len(FEATURES)) matrix.
+    current_aqi / baseline: shape (n,); target_times (datetime64[h]) and weather: shape (n, HORIZON_HOURS).
+    """
+    n = target_times.shape[0]
+    hours = (target_times.astype("datetime64[h]").astype(np.int64) % 24).astype(float)
+    days = target_times.astype("datetime64[D]")
+    dow = ((days.astype(np.int64) + 3) % 7).astype(float)   # 1970-01-01 was a Thursday
+    month = (days.astype("datetime64[M]").astype(np.int64) % 12).astype(float)
+    horizon = np.broadcast_to(np.arange(1, HORIZON_HOURS + 1, dtype=float), (n, HORIZON_HOURS))
+    cols = [
+        np.repeat(np.asarray(current_aqi, dtype=float), HORIZON_HOURS),
+        np.repeat(np.asarray(baseline, dtype=float), HORIZON_HOURS),
+        horizon.ravel(),
+        np.sin(2 * np.pi * hours / 24).ravel(),
+        np.cos(2 * np.pi * hours / 24).ravel(),
+        dow.ravel(),
+        np.sin(2 * np.pi * month / 12).ravel(),
+        np.cos(2 * np.pi * month / 12).ravel(),
+        np.asarray(temp, dtype=float).ravel(),
+        np.asarray(humidity, dtype=float).ravel(),
+        np.asarray(wind, dtype=float).ravel(),
+    ]
+    return np.column_stack(cols)
+
+def _as_float_array(values) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in (values or [])], dtype=float)
+
+def _fetch_hourly(url: str, points: Sequence[Tuple[float, float]], hourly: List[str],
+                  past_days: int = 0, forecast_days: int = 2) -> List[Dict[str, Any]]:
+    """One Open-Meteo request for all points (multi-coordinate); returns one payload per point."""
+    params = {
+        "latitude": ",".join(f"{lat:.4f}" for lat, _ in points),
+        "longitude": ",".join(f"{lon:.4f}" for _, lon in points),
+        "hourly": ",".join(hourly),
+        "timezone": "auto",
+        "past_days": past_days,
+        "forecast_days": forecast_days,
+    }
+    try:
+        resp = http_client.get(url, params=params, provider="open_meteo")
+        resp.raise_for_status()
+        j = resp.json()
+    except Exception as e:
+        raise FetchError(f"Failed to fetch hourly data from Open-Meteo: {e}")
+    return j if isinstance(j, list) else [j]
+
+def _baselines(lat: float, lon: float, issued: np.ndarray) -> np.ndarray:
+    """
+    PM2.5 mean of the month before each issue time (datetime64), NaN if unknown.
+    The previous month is closed, so training and inference both read it from
+    the local history store; no network calls.
+    """
+    labels = [str(m) for m in (np.asarray(issued, dtype="datetime64[h]").astype("datetime64[M]") - 1)]
+    try:
+        values = stored_monthly_pm25(lat, lon, sorted(set(labels)))
+    except Exception:
+        values = {}
+    return np.array([values.get(m, np.nan) for m in labels], dtype=float)
+
+# ---------- training (offline)
+def build_training_set(points: Sequence[Tuple[float, float]], past_days: int = 60,
+                       issue_every: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reconstructs past forecast situations from Open-Meteo hourly history:
+    at every `issue_every`-th hour the AQI then is the "current" reading and the
+    next HORIZON_HOURS hours of AQI are the targets.
+    """
+    aq = _fetch_hourly(AIR_QUALITY_URL, points, ["us_aqi"], past_days=past_days, forecast_days=1)
+    wx = _fetch_hourly(FORECAST_URL, points, WEATHER_VARS, past_days=past_days, forecast_days=1)
+    X_parts, y_parts = [], []
+    for (lat, lon), a, w in zip(points, aq, wx):
+        aqi = _as_float_array((a.get("hourly") or {}).get("us_aqi"))
+        hw = w.get("hourly") or {}
+        times = np.array((a.get("hourly") or {}).get("time") or [], dtype="datetime64[h]")
+        n = min(aqi.size, times.size, *(len(hw.get(v) or []) for v in WEATHER_VARS))
+        if n <= HORIZON_HOURS:
+            continue
+        temp, rh, wind = (_as_float_array(hw.get(v))[:n] for v in WEATHER_VARS)
+        starts = np.arange(0, n - HORIZON_HOURS, issue_every)
+        window = starts[:, None] + np.arange(1, HORIZON_HOURS + 1)
+        baseline = _baselines(lat, lon, times[starts])
+        X = _features(aqi[starts], baseline, times[window], temp[window], rh[window], wind[window])
+        y = aqi[window].ravel()
+        keep = ~np.isnan(y)
+        X_parts.append(X[keep])
+        y_parts.append(y[keep])
+    if not X_parts:
+        raise FetchError("No training data could be built for the given points")
+    return np.vstack(X_parts), np.concatenate(y_parts)
+
+def train(points: Sequence[Tuple[float, float]], past_days: int = 60, path: Optional[str] = None) -> Dict[str, Any]:
+    """Fits the regressor on the given locations and persists it with joblib."""
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    X, y = build_training_set(points, past_days=past_days)
+    model = HistGradientBoostingRegressor(max_iter=200, learning_rate=0.08, max_leaf_nodes=31)
+    model.fit(X, y)
+    path = Path(path or settings.FORECAST_MODEL_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump({"model": model, "features": FEATURES, "trained_at": datetime.utcnow().isoformat()}, path)
+    global _model
+    with _model_lock:
+        _model = None
+    return {"samples": int(y.size), "path": str(path)}
+
+# ---------- inference
+_model = None
+_model_lock = threading.Lock()
+forecast_cache = GeoTTLCache(ttl=settings.FORECAST_CACHE_TTL, max_entries=settings.GEO_CACHE_MAX_ENTRIES)
+
+def _load_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            try:
+                bundle = run_blocking(joblib.load, settings.FORECAST_MODEL_PATH)
+            except (OSError, EOFError) as e:
+                raise FetchError(f"AQI forecast model not available (train it first): {e}")
+            if bundle.get("features") != FEATURES:
+                raise FetchError("AQI forecast model was trained with a different feature set")
+            _model = bundle["model"]
+        return _model
+
+def predict_batch(current_aqi: np.ndarray, baseline: np.ndarray, target_times: np.ndarray,
+                  temp: np.ndarray, humidity: np.ndarray, wind: np.ndarray) -> np.ndarray:
+    """One vectorized predict() for all locations; returns AQI of shape (n, HORIZON_HOURS)."""
+    X = _features(current_aqi, baseline, target_times, temp, humidity, wind)
+    pred = run_blocking(_load_model().predict, X).reshape(-1, HORIZON_HOURS)
+    return np.clip(pred, 0, 500)
+
+def _forecast_chunk(points: Sequence[Tuple[float, float]]) -> List[Dict[str, Any]]:
+    """Forecasts for one chunk of points: two multi-coordinate requests and one predict()."""
+    air = _fetch_hourly(AIR_QUALITY_URL, points, ["us_aqi"], forecast_days=1)
+    weather = _fetch_hourly(FORECAST_URL, points, WEATHER_VARS)
+    n = len(points)
+    current = np.full(n, np.nan)
+    baseline = np.full(n, np.nan)
+    times = np.empty((n, HORIZON_HOURS), dtype="datetime64[h]")
+    temp, rh, wind = (np.full((n, HORIZON_HOURS), np.nan) for _ in range(3))
+    for k, ((lat, lon), a, w) in enumerate(zip(points, air, weather)):
+        local_now = np.datetime64(datetime.utcnow() + timedelta(seconds=w.get("utc_offset_seconds") or 0), "h")
+        ha = a.get("hourly") or {}
+        aq_times = np.array(ha.get("time") or [], dtype="datetime64[h]")
+        aqi = _as_float_array(ha.get("us_aqi"))
+        at = int(np.searchsorted(aq_times, local_now))
+        if at < min(aq_times.size, aqi.size) and aq_times[at] == local_now:
+            current[k] = aqi[at]
+        baseline[k] = _baselines(lat, lon, np.array([local_now]))[0]
+        hw = w.get("hourly") or {}
+        all_times = np.array(hw.get("time") or [], dtype="datetime64[h]")
+        start = int(np.searchsorted(all_times, local_now)) + 1
+        times[k] = local_now + np.arange(1, HORIZON_HOURS + 1)
+        for arr, var in ((temp, "temperature_2m"), (rh, "relativehumidity_2m"), (wind, "windspeed_10m")):
+            vals = _as_float_array(hw.get(var))[start:start + HORIZON_HOURS]
+            arr[k, :vals.size] = vals
+
+    pred = predict_batch(current, baseline, times, temp, rh, wind)
+    results = []
+    for k, (lat, lon) in enumerate(points):
+        result = {
+            "lat": lat,
+            "lon": lon,
+            "current_aqi": None if np.isnan(current[k]) else int(current[k]),
+            "times": [str(t) + ":00" for t in times[k]],
+            "aqi": [int(round(v)) for v in pred[k]],
+            "peak_aqi": int(round(pred[k].max())),
+        }
+        forecast_cache.put("forecast", location_key(f"{lat},{lon}"), result)
+        results.append(result)
+    return results
+
+def forecast_points(points: Sequence[Tuple[float, float]]) -> List[Dict[str, Any]]:
+    """
+    Next-24h hourly AQI for every (lat, lon). Uncached points are forecast in
+    chunks of AQI_BATCH_CHUNK, each from two multi-coordinate Open-Meteo
+    requests (current us_aqi, as used in training, and the hourly weather) and
+    the locally stored PM2.5 history; results are cached per cell.
+    A failed chunk leaves only its own entries None; if every chunk fails the
+    first error is raised.
+    """
+    out: List[Optional[Dict[str, Any]]] = []
+    todo = []
+    for lat, lon in points:
+        found, value = forecast_cache.get("forecast", location_key(f"{lat},{lon}"))
+        out.append(value if found else None)
+        if not found:
+            todo.append(len(out) - 1)
+    if not todo:
+        return out
+
+    chunk = settings.AQI_BATCH_CHUNK
+    error = None
+    done = 0
+    for c in range(0, len(todo), chunk):
+        part = todo[c:c + chunk]
+        try:
+            results = _forecast_chunk([points[i] for i in part])
+        except Exception as e:
+            print(f"Forecast chunk of {len(part)} points failed: {e}")
+            error = error or e
+            continue
+        for i, result in zip(part, results):
+            out[i] = result
+        done += 1
+    if done == 0 and error is not None:
+        raise error
+    return out
+
+def forecast_locations(locations: Sequence[str], iso: str = "IN") -> Dict[str, Dict[str, Any]]:
+    """
+    Forecasts for named places ("Kolkata") or "lat,lon" strings in one batch.
+    Names resolve to coordinates through the local OpenAQ location index.
+    """
+    points, names = [], []
+    for loc in locations:
+        try:
+            if "," in loc:
+                lat, lon = [float(p) for p in loc.split(",")]
+            else:
+                lat, lon = get_index(iso).coords(_resolve_location_id(loc, iso=iso))
+        except Exception:
+            continue
+        points.append((lat, lon))
+        names.append(loc)
+    if not points:
+        return {}
+    return dict(zip(names, forecast_points(points)))
+
+if __name__ == "__main__":
+    # python forecaster.py 22.5726,88.3639 28.6139,77.2090 ...
+    pts = [tuple(float(x) for x in arg.split(",")) for arg in sys.argv[1:]]
+    if not pts:
+        print("usage: python forecaster.py lat,lon [lat,lon ...]")
+        sys.exit(1)
+    print(train(pts))
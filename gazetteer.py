@@ -0,0 +1,143 @@
+import csv
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+from scipy.spatial import cKDTree
+import http_client
+import geocoder
+from config import get_settings
+from exceptions import FetchError
+from geo_cache import GeoTTLCache, location_key
+from location_index import EARTH_RADIUS_M, _unit_vectors
+
+settings = get_settings()
+NOMINATIM_REVERSE_URL = "https://nominatim.openstreetmap.org/reverse"
+
+class Gazetteer:
+    """
+    Nearest-place lookups over the bundled places file (CSV: name, admin1,
+    country, lat, lon), answered from a KD-tree on unit vectors.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self._places: List[Dict[str, Any]] = []
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    try:
+                        lat, lon = float(row["lat"]), float(row["lon"])
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    self._places.append({
+                        "city": row.get("name") or "",
+                        "admin1": row.get("admin1") or "",
+                        "country": row.get("country") or "",
+                        "lat": lat,
+                        "lon": lon,
+                    })
+        except OSError:
+            pass
+        lats = [p["lat"] for p in self._places]
+        lons = [p["lon"] for p in self._places]
+        self._tree = cKDTree(_unit_vectors(lats, lons)) if self._places else None
+
+    def __len__(self) -> int:
+        return len(self._places)
+
+    def nearest(self, lat: float, lon: float, max_km: float) -> Optional[Dict[str, Any]]:
+        if self._tree is None:
+            return None
+        chord = 2 * np.sin(min(max_km * 1000 / EARTH_RADIUS_M, np.pi) / 2)
+        dist, idx = self._tree.query(_unit_vectors([lat], [lon])[0], distance_upper_bound=chord)
+        if not np.isfinite(dist):
+            return None
+        return self._places[idx]
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+def get_gazetteer() -> Gazetteer:
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            _gazetteer = Gazetteer(Path(settings.GAZETTEER_PATH))
+        return _gazetteer
+
+# ---------- residual remote lookups (points with no bundled place nearby)
+remote_cache = GeoTTLCache(ttl=settings.GAZETTEER_REMOTE_TTL, max_entries=settings.GAZETTEER_REMOTE_MAX_ENTRIES)
+# one worker keeps background lookups serialized; every remote call, background or
+# waited on, also takes a token from geocoder.limiter (Nominatim: about one request per second)
+_remote_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reverse-geocode")
+_pending = set()
+_pending_lock = threading.Lock()
+
+def _nominatim_reverse(lat: float, lon: float, timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    One rate-limited Nominatim reverse lookup. Raises FetchError if no token
+    frees up within `timeout` (GEOCODE_WAIT_TIMEOUT by default).
+    """
+    if not geocoder.limiter.acquire(settings.GEOCODE_WAIT_TIMEOUT if timeout is None else timeout):
+        raise FetchError(f"Geocoding rate limit: gave up waiting for {lat},{lon}")
+    params = {"format": "json", "lat": lat, "lon": lon, "zoom": 10}
+    try:
+        r = http_client.get(NOMINATIM_REVERSE_URL, params=params, headers={"User-Agent": "AirAware"}, provider="nominatim")
+        r.raise_for_status()
+        data = r.json()
+    except Exception as e:
+        raise FetchError(f"Reverse geocoding failed for {lat},{lon}: {e}")
+    address = data.get("address") or {}
+    return {
+        "city": address.get("city") or address.get("town") or address.get("village") or data.get("display_name"),
+        "admin1": address.get("state") or "",
+        "country": address.get("country") or "",
+        "lat": float(data.get("lat") or lat),
+        "lon": float(data.get("lon") or lon),
+    }
+
+def _remote_lookup(key: str, lat: float, lon: float) -> None:
+    try:
+        remote_cache.put("place", key, _nominatim_reverse(lat, lon, timeout=float("inf")))
+    except FetchError:
+        pass
+    finally:
+        with _pending_lock:
+            _pending.discard(key)
+
+def _remote_in_background(key: str, lat: float, lon: float) -> None:
+    with _pending_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    try:
+        _remote_pool.submit(_remote_lookup, key, lat, lon)
+    except RuntimeError:
+        with _pending_lock:
+            _pending.discard(key)
+
+def reverse_geocode(lat: float, lon: float, wait: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Place nearest to (lat, lon): the bundled gazetteer first, then the cached
+    result of an earlier remote lookup for the cell. On a miss the remote lookup
+    runs in the background and None is returned, unless wait=True.
+    """
+    lat, lon = float(lat), float(lon)
+    place = get_gazetteer().nearest(lat, lon, settings.GAZETTEER_MAX_DISTANCE_KM)
+    if place is not None:
+        return place
+    key = location_key(f"{lat},{lon}")
+    found, place = remote_cache.get("place", key)
+    if found:
+        return place
+    if wait:
+        place = _nominatim_reverse(lat, lon)
+        remote_cache.put("place", key, place)
+        return place
+    _remote_in_background(key, lat, lon)
+    return None
+
+def place_name(lat: float, lon: float) -> str:
+    """City label for (lat, lon); never waits on the network."""
+    place = reverse_geocode(lat, lon)
+    return (place or {}).get("city") or "Unknown"
@@ -0,0 +1,146 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from config import get_settings
+from singleflight import flights
+
+settings = get_settings()
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def geohash(lat: float, lon: float, precision: int = 6) -> str:
+    """
+    Standard geohash of (lat, lon). Precision 5 ~ 4.9km cells, 6 ~ 1.2km x 0.6km.
+    """
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    out = []
+    bits = 0
+    ch = 0
+    even = True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch = ch << 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch = ch << 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_GEOHASH_BASE32[ch])
+            bits = 0
+            ch = 0
+    return "".join(out)
+
+def location_key(location: str, precision: Optional[int] = None) -> str:
+    """
+    Normalizes a realtime_aqi style location ("CityName" or "lat,lon") to a cache cell.
+    Coordinates snap to a geohash cell, names are case/whitespace folded.
+    """
+    if precision is None:
+        precision = settings.GEO_CACHE_PRECISION
+    if "," in location:
+        try:
+            lat, lon = [float(p.strip()) for p in location.split(",")]
+            return "gh:" + geohash(lat, lon, precision)
+        except ValueError:
+            pass
+    return "name:" + " ".join(location.lower().split())
+
+class GeoTTLCache:
+    """
+    Thread-safe TTL + LRU cache keyed by (namespace, cell).
+    max_entries caps memory; the least recently used entry is evicted first.
+    """
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, namespace: str, cell: Hashable):
+        key = (namespace, cell)
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True, item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, namespace: str, cell: Hashable, value: Any) -> None:
+        key = (namespace, cell)
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def peek(self, namespace: str, cell: Hashable):
+        """get() without touching LRU order or hit/miss counters."""
+        with self._lock:
+            item = self._data.get((namespace, cell))
+            if item is not None and item[0] > time.monotonic():
+                return True, item[1]
+            return False, None
+
+    def get_or_fetch(self, namespace: str, cell: Hashable, fetch: Callable[[], Any],
+                     timeout: Optional[float] = None) -> Any:
+        """
+        Cached value of the cell, else one fetch shared by every concurrent
+        caller missing the same cell of this cache (single-flight). `timeout`
+        bounds how long a caller waits on someone else's fetch.
+        """
+        found, value = self.get(namespace, cell)
+        if found:
+            return value
+
+        def fetch_and_store():
+            # a flight that landed between get() and now may already have filled the cell
+            found, value = self.peek(namespace, cell)
+            if found:
+                return value
+            value = fetch()
+            self.put(namespace, cell, value)
+            return value
+        # keyed by cache instance too: another cache may use the same namespace
+        return flights.do(namespace, (id(self), cell), fetch_and_store, timeout=timeout)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0
+            }
+
+# ---------- shared instance used by realtime_aqi, route exposure and /api/aqi
+aqi_cache = GeoTTLCache(ttl=settings.GEO_CACHE_TTL, max_entries=settings.GEO_CACHE_MAX_ENTRIES)
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from config import get_settings
+from exceptions import FetchError, NotFoundError
+from location_index import normalize_name
+from realtime_weather import geocode_city_to_latlon
+
+settings = get_settings()
+LatLon = Tuple[float, float]
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is free or the timeout passes."""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+class GeocodeCache:
+    """
+    Place string -> (lat, lon) keyed on normalize_name(). Places Nominatim could
+    not find are kept as None for GEOCODE_NEGATIVE_TTL so they are not re-asked
+    every time. Persisted as JSON (atomic rewrite on every put).
+    """
+    def __init__(self, path: Optional[Path], negative_ttl: float):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self._data: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.path:
+            self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+
+    def _save(self) -> None:
+        # caller holds the lock
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._data, f)
+        os.replace(tmp, self.path)
+
+    def get(self, key: str) -> Tuple[bool, Optional[LatLon]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry["latlon"] is not None or time.time() - entry["stored_at"] < self.negative_ttl):
+                self.hits += 1
+                return True, tuple(entry["latlon"]) if entry["latlon"] is not None else None
+            self.misses += 1
+            return False, None
+
+    def put(self, key: str, latlon: Optional[LatLon]) -> None:
+        with self._lock:
+            self._data[key] = {"latlon": list(latlon) if latlon is not None else None, "stored_at": time.time()}
+            if self.path:
+                try:
+                    self._save()
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "persistent": bool(self.path)
+            }
+
+cache = GeocodeCache(
+    Path(settings.GEOCODE_CACHE_PATH) if settings.GEOCODE_CACHE_PATH else None,
+    negative_ttl=settings.GEOCODE_NEGATIVE_TTL
+)
+# shared by every thread; Nominatim's usage policy is about one request per second
+limiter = TokenBucket(rate=settings.GEOCODE_RATE_PER_SEC, capacity=settings.GEOCODE_BURST)
+# queued lookups run one at a time behind the limiter
+_queue = ThreadPoolExecutor(max_workers=1, thread_name_prefix="geocode")
+
+def cached(place: str) -> Tuple[bool, Optional[LatLon]]:
+    """(found, latlon) from the cache only; never calls Nominatim."""
+    return cache.get(normalize_name(place))
+
+def geocode(place: str, timeout: Optional[float] = None) -> LatLon:
+    """
+    (lat, lon) for a place string: cache first, otherwise one rate-limited
+    Nominatim call. Raises FetchError if no token frees up within `timeout`
+    (GEOCODE_WAIT_TIMEOUT by default), NotFoundError if the place cannot be found.
+    """
+    key = normalize_name(place)
+    if not key:
+        raise FetchError("Empty place name")
+    found, latlon = cache.get(key)
+    if found:
+        if latlon is None:
+            raise NotFoundError(f"Geocoding returned no results for {place}")
+        return latlon
+    if not limiter.acquire(settings.GEOCODE_WAIT_TIMEOUT if timeout is None else timeout):
+        raise FetchError(f"Geocoding rate limit: gave up waiting for {place}")
+    try:
+        latlon = geocode_city_to_latlon(place)
+    except NotFoundError:
+        cache.put(key, None)
+        raise
+    cache.put(key, latlon)
+    return latlon
+
+def geocode_many_async(places: Sequence[str],
+                       on_done: Callable[[List[Optional[LatLon]]], None]) -> "Future":
+    """
+    Queues the places behind the shared limiter (waiting as long as it takes)
+    and calls on_done with one (lat, lon) or None per place.
+    """
+    def run():
+        results = []
+        for place in places:
+            try:
+                results.append(geocode(place, timeout=float("inf")))
+            except FetchError:
+                results.append(None)
+        on_done(results)
+        return results
+    return _queue.submit(run)
@@ -0,0 +1,20 @@
+import sys
+from typing import Any, Callable
+
+def patched() -> bool:
+    """True when main.py has monkey-patched the process for eventlet (SERVER_ASYNC_MODE=eventlet)."""
+    if "eventlet" not in sys.modules:
+        return False
+    from eventlet import patcher
+    return patcher.is_monkey_patched("thread")
+
+def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Calls fn in eventlet's OS-thread pool when serving on green threads, so
+    calls that block in C (sqlite3, NumPy / scikit-learn, joblib) don't stall
+    every other request; a plain call otherwise. Don't take green locks in fn.
+    """
+    if patched():
+        from eventlet import tpool
+        return tpool.execute(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
@@ -1,65 +1,101 @@
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-import requests
-from .exceptions import FetchError
-from .config import get_settings
+from typing import List, Dict, Any, Iterator, Optional
+import http_client
+from location_index import get_index
+from history_store import get_store
+from geo_cache import GeoTTLCache
+from exceptions import FetchError
+from config import get_settings
 settings = get_settings()
 OPENAQ_API_KEY = settings.OPENAQ_TOKEN
 BASE_URL = "https://api.openaq.org/v3"
 PM25_PARAMETER_ID = 2 
+PAGE_SIZE = settings.OPENAQ_PAGE_SIZE
+NEARBY_RADIUS_M = 20000
+# the open current month can't go in the history store; keep it briefly in memory
+_current_month = GeoTTLCache(ttl=settings.HISTORY_CURRENT_TTL, max_entries=2000)
 
 def _headers() -> Dict[str, str]:
     if not OPENAQ_API_KEY:
         raise FetchError("OPENAQ_API_KEY not set in environment")
     return {"X-API-Key": OPENAQ_API_KEY}
 
-def _compute_datetime_range_iso(months: int) -> tuple[str, str]:
+def _paginate(url: str, params: Optional[Dict[str, Any]] = None, what: str = "results") -> Iterator[Dict[str, Any]]:
     """
-    Returns (datetime_from, datetime_to) as ISO8601 strings (UTC) for the last `months` calendar months.
-
-    Example: if today is 2025-11-25 and months=12,
-    datetime_from ~ 2024-12-01T00:00:00Z, datetime_to = now.
+    Yields every row of a paginated OpenAQ v3 listing, one page in memory at a time.
+    Stops after the first short page.
     """
+    params = dict(params or {})
+    params["limit"] = PAGE_SIZE
+    page = 1
+    while True:
+        params["page"] = page
+        try:
+            resp = http_client.get(url, headers=_headers(), params=params, provider="openaq")
+            resp.raise_for_status()
+            j = resp.json()
+        except Exception as e:
+            raise FetchError(f"Error fetching {what} (page {page}): {e}")
+        results = (j or {}).get("results") or []
+        yield from results
+        if len(results) < PAGE_SIZE:
+            return
+        page += 1
+
+def _month_labels(months: int) -> List[str]:
+    """ "YYYY-MM" labels for the last `months` calendar months, oldest first, ending with the current month. """
     if months < 1:
         months = 1
-
     now = datetime.utcnow()
-    year = now.year
-    month = now.month
-    total_months = year * 12 + (month - 1) - (months - 1)
-    start_year = total_months // 12
-    start_month = total_months % 12 + 1
-    dt_from = datetime(start_year, start_month, 1)
-    dt_to = now
-    return dt_from.isoformat(timespec="seconds") + "Z", dt_to.isoformat(timespec="seconds") + "Z"
+    last = now.year * 12 + (now.month - 1)
+    return [f"{t // 12:04d}-{t % 12 + 1:02d}" for t in range(last - months + 1, last + 1)]
+
+
+def _month_start_iso(month: str) -> str:
+    return f"{month}-01T00:00:00Z"
+
+
+def _month_after_iso(month: str) -> str:
+    year, mon = [int(p) for p in month.split("-")]
+    t = year * 12 + mon
+    return f"{t // 12:04d}-{t % 12 + 1:02d}-01T00:00:00Z"
 
 
 def _is_lat_lon(location: str) -> bool:
     return "," in location and len(location.split(",")) == 2
 
 
-def _find_location_by_coords(location: str) -> int:
-    """
-    location: 'lat,lon' string.
-    Uses /v3/locations?coordinates=lat,lon&radius=20000&limit=1
-    Returns location ID or raises FetchError.
-    """
+def _parse_lat_lon(location: str) -> tuple[str, str]:
     try:
         lat_str, lon_str = [p.strip() for p in location.split(",")]
         float(lat_str)
         float(lon_str)
     except Exception:
         raise FetchError(f"Invalid coordinate format: '{location}' (expected 'lat,lon')")
+    return lat_str, lon_str
+
+
+def _find_location_by_coords(location: str, iso: str = "IN") -> int:
+    """
+    location: 'lat,lon' string.
+    Uses /v3/locations?coordinates=lat,lon&radius=20000&limit=1
+    The match is added to the local location index and persisted.
+    Returns location ID or raises FetchError.
+    """
+    lat_str, lon_str = _parse_lat_lon(location)
 
     params = {
         "coordinates": f"{lat_str},{lon_str}",
-        "radius": 20000, 
+        "radius": NEARBY_RADIUS_M, 
         "limit": 1,
     }
 
     try:
-        resp = requests.get(f"{BASE_URL}/locations", headers=_headers(), params=params, timeout=10)
+        resp = http_client.get(f"{BASE_URL}/locations", headers=_headers(), params=params, provider="openaq")
         resp.raise_for_status()
         j = resp.json()
     except Exception as e:
@@ -69,6 +105,9 @@ def _find_location_by_coords(location: str) -> int:
     if not results:
         raise FetchError(f"No OpenAQ locations found near coordinates {location}")
 
+    index = get_index(iso)
+    if index.upsert(results[:1]):
+        index.save()
     return int(results[0]["id"])
 
 
@@ -83,23 +122,10 @@ def _find_location_by_name(city: str, iso: str = "IN") -> int:
     if not city_lower:
         raise FetchError("Empty city name passed to _find_location_by_name")
 
-    params = {
-        "iso": iso,        
-        "limit": 1000,     
-        "page": 1,
-    }
-
-    try:
-        resp = requests.get(f"{BASE_URL}/locations", headers=_headers(), params=params, timeout=15)
-        resp.raise_for_status()
-        j = resp.json()
-    except Exception as e:
-        raise FetchError(f"Error fetching locations for city '{city}': {e}")
-
-    results = (j or {}).get("results") or []
     best_id: Optional[int] = None
 
-    for loc in results:
+    # stop paging as soon as a location matches
+    for loc in _paginate(f"{BASE_URL}/locations", {"iso": iso}, what=f"locations for city '{city}'"):
         name = (loc.get("name") or "").lower()
         locality = (loc.get("locality") or "").lower()
 
@@ -113,15 +139,79 @@ def _find_location_by_name(city: str, iso: str = "IN") -> int:
     return best_id
 
 
+def refresh_location_index(iso: str = "IN", force: bool = False) -> int:
+    """
+    Pages every OpenAQ location for the country into the local index (upsert)
+    and persists it. Skipped while the index is fresh unless `force`.
+    Returns the number of rows added or changed.
+    """
+    index = get_index(iso)
+    if not force and not index.is_stale():
+        return 0
+    batch: List[Dict[str, Any]] = []
+    changed = 0
+    for loc in _paginate(f"{BASE_URL}/locations", {"iso": iso}, what=f"locations for iso {iso}"):
+        batch.append(loc)
+        if len(batch) >= PAGE_SIZE:
+            changed += index.upsert(batch)
+            batch = []
+    changed += index.upsert(batch, refreshed=True)
+    index.save()
+    return changed
+
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def _refresh_in_background(iso: str) -> None:
+    with _refreshing_lock:
+        if iso in _refreshing:
+            return
+        _refreshing.add(iso)
+
+    def run():
+        try:
+            refresh_location_index(iso)
+        except FetchError as e:
+            print(f"Location index refresh failed for {iso}: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(iso)
+
+    threading.Thread(target=run, name=f"openaq-index-{iso}", daemon=True).start()
+
+
 def _resolve_location_id(location: str, iso: str = "IN") -> int:
     """
     location:
       - 'CityName'  -> matches against locations in country iso
       - 'lat,lon'   -> matches nearest location by coords
+    Answered from the local location index. The network is used to build the
+    index the first time, to refresh a stale one in the background, and for
+    coordinates with no indexed station within NEARBY_RADIUS_M.
     """
+    index = get_index(iso)
+    if len(index) == 0:
+        try:
+            refresh_location_index(iso, force=True)
+        except FetchError as e:
+            print(f"Location index build failed for {iso}: {e}")
+    elif index.is_stale():
+        _refresh_in_background(iso)
+
     if _is_lat_lon(location):
-        return _find_location_by_coords(location)
-    return _find_location_by_name(location, iso=iso)
+        lat_str, lon_str = _parse_lat_lon(location)
+        hit = index.nearest(float(lat_str), float(lon_str), NEARBY_RADIUS_M)
+        if hit is not None:
+            return hit
+        return _find_location_by_coords(location, iso=iso)
+    hit = index.find_by_name(location)
+    if hit is not None:
+        return hit
+    if len(index) == 0:
+        # index unavailable: fall back to scanning the listing directly
+        return _find_location_by_name(location, iso=iso)
+    raise FetchError(f"No OpenAQ location found that matches city '{location}' (iso={iso})")
 
 
 def _get_pm25_sensor_ids_for_location(location_id: int) -> List[int]:
@@ -130,10 +220,10 @@ def _get_pm25_sensor_ids_for_location(location_id: int) -> List[int]:
     Filters sensors where parameter.id == 2 (pm25).
     """
     try:
-        resp = requests.get(
+        resp = http_client.get(
             f"{BASE_URL}/locations/{location_id}",
             headers=_headers(),
-            timeout=10,
+            provider="openaq",
         )
         resp.raise_for_status()
         j = resp.json()
@@ -153,26 +243,206 @@ def _get_pm25_sensor_ids_for_location(location_id: int) -> List[int]:
     if not pm25_sensors:
         raise FetchError(f"No PM2.5 sensors found for location {location_id}")
     return pm25_sensors
-def _fetch_monthly_pm25(sensor_id: int, datetime_from: str, datetime_to: str) -> List[Dict[str, Any]]:
+def _iter_monthly_pm25(sensor_id: int, datetime_from: str, datetime_to: str) -> Iterator[Dict[str, Any]]:
     """
-    Calls /v3/sensors/{sensor_id}/days/monthly for the given time range.
-    Returns the raw 'results' list from the API.
+    Streams /v3/sensors/{sensor_id}/days/monthly rows for the given time range, across all pages.
     """
     url = f"{BASE_URL}/sensors/{sensor_id}/days/monthly"
     params = {
         "datetime_from": datetime_from,
         "datetime_to": datetime_to,
-        "limit": 1000,  
-        "page": 1,
     }
+    yield from _paginate(url, params, what=f"monthly PM2.5 for sensor {sensor_id}")
+
+def _fetch_monthly_pm25(sensor_id: int, datetime_from: str, datetime_to: str) -> List[Dict[str, Any]]:
+    """
+    Returns all monthly rows for the sensor as a list (see _iter_monthly_pm25).
+    """
+    return list(_iter_monthly_pm25(sensor_id, datetime_from, datetime_to))
+
+def _parse_monthly_row(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    period = row.get("period") or {}
+    dt_obj = (period.get("datetimeFrom") or {}).get("utc")
+    coverage = row.get("coverage") or {}
+    if not dt_obj:
+        dt_obj = (coverage.get("datetimeFrom") or {}).get("utc")
+    if not dt_obj:
+        return None
+    summary = row.get("summary") or {}
+    avg_val = summary.get("avg", row.get("value"))
+    if avg_val is None:
+        return None
+    return {
+        "month": dt_obj[:7],
+        "avg": float(avg_val),
+        "min": summary.get("min"),
+        "max": summary.get("max"),
+        "count": int(coverage.get("observedCount") or 0),
+    }
+
+class _MonthAccumulator:
+    """Merges one month across sensors: count-weighted mean, overall min/max, summed counts."""
+    def __init__(self, month: str):
+        self.month = month
+        self.weighted_sum = 0.0
+        self.weight = 0
+        self.plain_sum = 0.0
+        self.rows = 0
+        self.peak = None
+        self.least = None
+        self.count = 0
+
+    def add(self, row: Dict[str, Any]) -> None:
+        self.weighted_sum += row["avg"] * row["count"]
+        self.weight += row["count"]
+        self.plain_sum += row["avg"]
+        self.rows += 1
+        if row["max"] is not None:
+            self.peak = row["max"] if self.peak is None else max(self.peak, row["max"])
+        if row["min"] is not None:
+            self.least = row["min"] if self.least is None else min(self.least, row["min"])
+        self.count += row["count"]
+
+    def result(self) -> Dict[str, Any]:
+        avg = self.weighted_sum / self.weight if self.weight else self.plain_sum / self.rows
+        return {
+            "month": self.month,
+            "avg_aqi": round(avg, 1),
+            "peak_aqi": self.peak,
+            "least_aqi": self.least,
+            "count": self.count,
+        }
+
+_DONE = object()
+
+def _sensor_ids(location_id: int) -> List[int]:
+    store = get_store()
+    cached = store.get_sensor_ids(location_id, settings.HISTORY_SENSOR_TTL)
+    if cached is not None:
+        return cached
+    sensor_ids = _get_pm25_sensor_ids_for_location(location_id)
+    store.put_sensor_ids(location_id, sensor_ids)
+    return sensor_ids
+
+def _pump_sensor(sensor_id: int, months: List[str], out: "queue.Queue", stop: threading.Event) -> None:
+    """
+    Emits the sensor's parsed monthly rows in month order: closed months come
+    from the history store (the current month from a short in-memory TTL cache),
+    each run of missing months is fetched from OpenAQ with one ranged request
+    and written back.
+    """
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    store = get_store()
+    current = months[-1]
     try:
-        resp = requests.get(url, headers=_headers(), params=params, timeout=20)
-        resp.raise_for_status()
-        j = resp.json()
+        stored = store.get_months(sensor_id, months[:-1])
+        found, row = _current_month.get("pm25", (sensor_id, current))
+        if found:
+            stored[current] = row
+        i = 0
+        while i < len(months):
+            if months[i] in stored:
+                row = stored[months[i]]
+                if row is not None and not put((sensor_id, row)):
+                    return
+                i += 1
+                continue
+            j = i
+            while j < len(months) and months[j] not in stored:
+                j += 1
+            run = months[i:j]
+            dt_to = datetime.utcnow().isoformat(timespec="seconds") + "Z" if run[-1] == current else _month_after_iso(run[-1])
+            fetched = []
+            for row in _iter_monthly_pm25(sensor_id, _month_start_iso(run[0]), dt_to):
+                parsed = _parse_monthly_row(row)
+                if parsed is None or parsed["month"] not in run:
+                    continue
+                if not put((sensor_id, parsed)):
+                    return
+                if parsed["month"] != current:
+                    fetched.append(parsed)
+                else:
+                    _current_month.put("pm25", (sensor_id, current), parsed)
+            if run[-1] == current and not _current_month.get("pm25", (sensor_id, current))[0]:
+                _current_month.put("pm25", (sensor_id, current), None)
+            seen = {r["month"] for r in fetched}
+            store.put_months(sensor_id, fetched, empty_months=[m for m in run if m != current and m not in seen])
+            i = j
+        put((sensor_id, _DONE))
     except Exception as e:
-        raise FetchError(f"Error fetching monthly PM2.5 for sensor {sensor_id}: {e}")
-    results = (j or {}).get("results") or []
-    return results
+        put((sensor_id, e))
+
+def stream_history_aqi(location: str, months: int = 12, iso: str = "IN") -> Iterator[Dict[str, Any]]:
+    """
+    Generator form of history_aqi(): yields merged monthly rows in month order
+    as soon as every PM2.5 sensor of the location has reported past that month.
+
+    All sensors are paged concurrently into a bounded queue, so memory holds only
+    the months still waiting on a slower sensor, not the whole history. Closed
+    months already in the history store are served locally.
+    Assumes OpenAQ returns each sensor's periods in ascending order.
+    """
+    month_list = _month_labels(months)
+    loc_id = _resolve_location_id(location, iso=iso)
+    sensor_ids = _sensor_ids(loc_id)
+
+    rows: "queue.Queue" = queue.Queue(maxsize=settings.HISTORY_QUEUE_SIZE)
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=min(len(sensor_ids), settings.HISTORY_MAX_SENSOR_WORKERS))
+    for sid in sensor_ids:
+        pool.submit(_pump_sensor, sid, month_list, rows, stop)
+
+    # month each still-running sensor has reached; a month below all of them is final
+    watermark: Dict[int, str] = {sid: "" for sid in sensor_ids}
+    pending: Dict[str, _MonthAccumulator] = {}
+    errors: List[Exception] = []
+    try:
+        while watermark:
+            sid, item = rows.get()
+            if item is _DONE:
+                watermark.pop(sid, None)
+            elif isinstance(item, Exception):
+                watermark.pop(sid, None)
+                errors.append(item)
+            else:
+                watermark[sid] = max(watermark[sid], item["month"])
+                pending.setdefault(item["month"], _MonthAccumulator(item["month"])).add(item)
+            low = min(watermark.values()) if watermark else None
+            for month in sorted(pending):
+                if low is not None and month >= low:
+                    break
+                yield pending.pop(month).result()
+        if errors and len(errors) == len(sensor_ids):
+            raise FetchError(f"Failed to fetch PM2.5 history for location {loc_id}: {errors[0]}")
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def stored_monthly_pm25(lat: float, lon: float, months: List[str], iso: str = "IN") -> Dict[str, float]:
+    """
+    {month: count-weighted PM2.5 mean} for the nearest indexed location, read
+    only from the local index and history store (never the network). Months
+    that were never stored, or are stored empty, are left out.
+    """
+    loc_id = get_index(iso).nearest(lat, lon, NEARBY_RADIUS_M)
+    if loc_id is None or not months:
+        return {}
+    store = get_store()
+    sensor_ids = store.get_sensor_ids(loc_id, max_age=float("inf")) or []
+    merged: Dict[str, _MonthAccumulator] = {}
+    for sid in sensor_ids:
+        for month, row in store.get_months(sid, months).items():
+            if row is not None:
+                merged.setdefault(month, _MonthAccumulator(month)).add(row)
+    return {month: acc.result()["avg_aqi"] for month, acc in merged.items()}
+
 def history_aqi(location: str, months: int = 12, iso: str = "IN") -> List[Dict[str, Any]]:
     """
     Use OpenAQ v3 to get historical PM2.5 *monthly* stats for the last `months` months.
@@ -180,43 +450,17 @@ def history_aqi(location: str, months: int = 12, iso: str = "IN") -> List[Dict[s
     - location: "CityName"  or  "lat,lon"
     - iso:      country code (default "IN" for India)
 
+    Every page of every PM2.5 sensor at the location is fetched and merged per month
+    (see stream_history_aqi for the streaming form).
+
     Returns list of dicts like:
       {
         "month": "YYYY-MM",
-        "avg_aqi": float | None,
+        "avg_aqi": float | None,        # count-weighted across sensors
         "peak_aqi": float | None,
         "least_aqi": float | None,
         "count": int,                  # number of daily values aggregated
       }
     NOTE: These are PM2.5 µg/m³ values, not an official AQI index.
     """
-    dt_from, dt_to = _compute_datetime_range_iso(months)
-    loc_id = _resolve_location_id(location, iso=iso)
-    sensor_ids = _get_pm25_sensor_ids_for_location(loc_id)
-    sensor_id = sensor_ids[0]
-    results = _fetch_monthly_pm25(sensor_id, dt_from, dt_to)
-    monthly: Dict[str, Dict[str, Any]] = {}
-    for row in results:
-        period = row.get("period") or {}
-        dt_obj = (period.get("datetimeFrom") or {}).get("utc")
-        if not dt_obj:
-            coverage = row.get("coverage") or {}
-            dt_obj = (coverage.get("datetimeFrom") or {}).get("utc")
-        if not dt_obj:
-            continue
-        month_label = dt_obj[:7]
-        summary = row.get("summary") or {}
-        avg_val = int(summary.get("avg", row.get("value")))
-        min_val = int(summary.get("min"))
-        max_val = int(summary.get("max"))
-        coverage = row.get("coverage") or {}
-        count_val = int(coverage.get("observedCount"))
-        monthly[month_label] = {
-            "month": month_label,
-            "avg_aqi": avg_val,
-            "peak_aqi": max_val,
-            "least_aqi": min_val,
-            "count": count_val,
-        }
-    ordered_months = sorted(monthly.keys())
-    return [monthly[m] for m in ordered_months]
\ No newline at end of file
+    return list(stream_history_aqi(location, months=months, iso=iso))
@@ -0,0 +1,211 @@
+import calendar
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config import get_settings
+from green import run_blocking
+
+settings = get_settings()
+
+class HistoryStore:
+    """
+    SQLite store of merged-ready monthly PM2.5 rows keyed by (sensor_id, month).
+
+    Only closed months are stored, so they never need refetching. A month that
+    OpenAQ returned nothing for is stored as an empty row (avg NULL) so it is not
+    asked for again, except within `empty_recheck_days` of the month closing
+    (OpenAQ may not have aggregated it yet): such rows expire after `empty_ttl`
+    seconds. Location -> sensor id lists are cached with a TTL.
+    compact() enforces the retention window and the on-disk size cap.
+    """
+    def __init__(self, path: Path, max_bytes: int, retention_months: int,
+                 empty_recheck_days: float = 0, empty_ttl: float = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.retention_months = retention_months
+        self.empty_recheck_days = empty_recheck_days
+        self.empty_ttl = empty_ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS monthly (
+                    sensor_id INTEGER NOT NULL,
+                    month TEXT NOT NULL,
+                    avg REAL,
+                    min REAL,
+                    max REAL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    last_access REAL NOT NULL,
+                    fetched_at REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (sensor_id, month)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS location_sensors (
+                    location_id INTEGER PRIMARY KEY,
+                    sensor_ids TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                );
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(monthly)")}
+            if "fetched_at" not in columns:
+                # files from before empty-month rechecks: treat old rows as fetched long ago
+                self._conn.execute("ALTER TABLE monthly ADD COLUMN fetched_at REAL NOT NULL DEFAULT 0")
+            self._conn.commit()
+
+    @staticmethod
+    def month_closed_at(month: str) -> float:
+        """Epoch seconds at which "YYYY-MM" ended (start of the next month, UTC)."""
+        year, mon = int(month[:4]), int(month[5:7])
+        year, mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+        return float(calendar.timegm((year, mon, 1, 0, 0, 0)))
+
+    def _empty_expired(self, month: str, fetched_at: float, now: float) -> bool:
+        # an empty month is final once it had time to be aggregated upstream
+        if now - self.month_closed_at(month) > self.empty_recheck_days * 86400:
+            return False
+        return now - fetched_at > self.empty_ttl
+
+    def _run(self, fn):
+        # serializes use of the one connection; the sqlite work itself runs off
+        # the green-thread hub when serving under eventlet
+        with self._lock:
+            return run_blocking(fn, self._conn)
+
+    # ---- monthly rows
+    def get_months(self, sensor_id: int, months: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Returns {month: row} for the stored months among `months`; row is None
+        for months stored as empty. Months not in the result were never stored
+        or are recently closed empty months due for a recheck.
+        """
+        if not months:
+            return {}
+        now = time.time()
+
+        def read(conn):
+            rows = conn.execute(
+                "SELECT month, avg, min, max, count, fetched_at FROM monthly WHERE sensor_id=? AND month BETWEEN ? AND ?",
+                (sensor_id, min(months), max(months))
+            ).fetchall()
+            if rows:
+                conn.execute(
+                    "UPDATE monthly SET last_access=? WHERE sensor_id=? AND month BETWEEN ? AND ?",
+                    (now, sensor_id, min(months), max(months))
+                )
+                conn.commit()
+            return rows
+
+        found = {}
+        for month, avg, mn, mx, count, fetched_at in self._run(read):
+            if avg is None:
+                if not self._empty_expired(month, fetched_at, now):
+                    found[month] = None
+            else:
+                found[month] = {"month": month, "avg": avg, "min": mn, "max": mx, "count": count}
+        return {m: found[m] for m in months if m in found}
+
+    def put_months(self, sensor_id: int, rows: Iterable[Dict[str, Any]], empty_months: Iterable[str] = ()) -> None:
+        now = time.time()
+        values = [(sensor_id, r["month"], r["avg"], r["min"], r["max"], r["count"], now, now) for r in rows]
+        values += [(sensor_id, m, None, None, None, 0, now, now) for m in empty_months]
+        if not values:
+            return
+
+        def write(conn):
+            conn.executemany(
+                "INSERT OR REPLACE INTO monthly (sensor_id, month, avg, min, max, count, last_access, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                values
+            )
+            conn.commit()
+        self._run(write)
+        if self.size_bytes() > self.max_bytes:
+            self.compact()
+
+    # ---- location -> sensors
+    def get_sensor_ids(self, location_id: int, max_age: float) -> Optional[List[int]]:
+        row = self._run(lambda conn: conn.execute(
+            "SELECT sensor_ids, fetched_at FROM location_sensors WHERE location_id=?", (location_id,)
+        ).fetchone())
+        if row is None or time.time() - row[1] > max_age:
+            return None
+        return json.loads(row[0])
+
+    def put_sensor_ids(self, location_id: int, sensor_ids: List[int]) -> None:
+        def write(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO location_sensors (location_id, sensor_ids, fetched_at) VALUES (?, ?, ?)",
+                (location_id, json.dumps(sensor_ids), time.time())
+            )
+            conn.commit()
+        self._run(write)
+
+    # ---- maintenance
+    @staticmethod
+    def _pages(conn) -> Tuple[int, int, int]:
+        # (page_count, freelist_count, page_size)
+        return tuple(conn.execute(f"PRAGMA {name}").fetchone()[0] for name in ("page_count", "freelist_count", "page_size"))
+
+    def size_bytes(self) -> int:
+        pages, _, page_size = self._run(self._pages)
+        return pages * page_size
+
+    def compact(self) -> Dict[str, int]:
+        """
+        Drops months outside the retention window, then evicts the least recently
+        read sensors until the file fits under max_bytes, and vacuums.
+        """
+        now = time.gmtime()
+        total = now.tm_year * 12 + (now.tm_mon - 1) - self.retention_months
+        cutoff = f"{total // 12:04d}-{total % 12 + 1:02d}"
+
+        def expire(conn):
+            count = conn.execute("DELETE FROM monthly WHERE month < ?", (cutoff,)).rowcount
+            conn.commit()
+            return count
+
+        def evict_one(conn):
+            row = conn.execute(
+                "SELECT sensor_id FROM monthly GROUP BY sensor_id ORDER BY MAX(last_access) LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            count = conn.execute("DELETE FROM monthly WHERE sensor_id=?", (row[0],)).rowcount
+            conn.commit()
+            return count, self._pages(conn)
+
+        expired = self._run(expire)
+        evicted = 0
+        while self.size_bytes() > self.max_bytes:
+            result = self._run(evict_one)
+            if result is None:
+                break
+            count, (pages, freed, page_size) = result
+            evicted += count
+            # page_count only shrinks after a vacuum; free pages are reused either way
+            if (pages - freed) * page_size <= self.max_bytes:
+                break
+        if expired or evicted:
+            self._run(lambda conn: conn.execute("VACUUM"))
+        return {"expired": expired, "evicted": evicted, "size_bytes": self.size_bytes()}
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> HistoryStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore(
+                Path(settings.CACHE_DIR) / "history.sqlite3",
+                max_bytes=int(settings.HISTORY_STORE_MAX_MB * 1024 * 1024),
+                retention_months=settings.HISTORY_STORE_RETENTION_MONTHS,
+                empty_recheck_days=settings.HISTORY_EMPTY_RECHECK_DAYS,
+                empty_ttl=settings.HISTORY_EMPTY_TTL
+            )
+        return _store
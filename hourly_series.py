@@ -0,0 +1,144 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import http_client
+from config import get_settings
+from exceptions import FetchError
+from geo_cache import GeoTTLCache, location_key
+from singleflight import flights
+
+settings = get_settings()
+
+# kind -> endpoint and hourly variables kept in the series
+SERIES = {
+    "weather": {
+        "url": "https://api.open-meteo.com/v1/forecast",
+        "hourly": ["temperature_2m", "relativehumidity_2m", "apparent_temperature", "weathercode", "windspeed_10m"],
+    },
+    "air_quality": {
+        "url": "https://air-quality-api.open-meteo.com/v1/air-quality",
+        "hourly": ["us_aqi", "pm10", "pm2_5", "carbon_monoxide", "nitrogen_dioxide", "ozone", "sulphur_dioxide"],
+    },
+}
+
+# a window fetched at any point of an hour still covers the hour the TTL ends in
+series_cache = GeoTTLCache(ttl=settings.HOURLY_SERIES_TTL, max_entries=settings.GEO_CACHE_MAX_ENTRIES)
+
+def _fetch(kind: str, points: Sequence[Tuple[float, float]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    One Open-Meteo request for all points, trimmed to a few hours around now
+    (past_hours / forecast_hours) instead of the default multi-day arrays.
+    """
+    conf = SERIES[kind]
+    params = {
+        "latitude": ",".join(f"{lat:.4f}" for lat, _ in points),
+        "longitude": ",".join(f"{lon:.4f}" for _, lon in points),
+        "hourly": ",".join(conf["hourly"]),
+        "past_hours": 1,
+        "forecast_hours": settings.HOURLY_SERIES_FORECAST_HOURS,
+        "timezone": "auto",
+    }
+    try:
+        resp = http_client.get(conf["url"], params=params, provider="open_meteo")
+        resp.raise_for_status()
+        j = resp.json()
+    except Exception as e:
+        raise FetchError(f"Failed to fetch {kind} from Open-Meteo: {e}")
+    if isinstance(j, dict):
+        if j.get("error"):
+            raise FetchError(j.get("reason") or f"{kind} data unavailable")
+        j = [j]
+    series = []
+    for item in j:
+        if not isinstance(item, dict) or item.get("error"):
+            series.append(None)
+            continue
+        hourly = item.get("hourly") or {}
+        series.append({
+            "utc_offset_seconds": item.get("utc_offset_seconds") or 0,
+            "hourly": {k: hourly.get(k) or [] for k in ["time"] + conf["hourly"]},
+        })
+    return series
+
+def at_current_hour(series: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Picks every variable at the series' current local hour (nearest hour if it is missing)."""
+    now = now or datetime.utcnow()
+    local = now + timedelta(seconds=series["utc_offset_seconds"])
+    stamp = local.strftime("%Y-%m-%dT%H:00")
+    times = series["hourly"]["time"]
+    if stamp in times:
+        idx = times.index(stamp)
+    else:
+        # times are ISO strings, so lexical order is time order
+        idx = max(0, min(len(times) - 1, sum(1 for t in times if t <= stamp) - 1))
+    out = {}
+    for var, values in series["hourly"].items():
+        out[var] = values[idx] if len(values) > idx else None
+    return out
+
+def get_many(kind: str, points: Sequence[Tuple[float, float]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Hourly series for each point, one per cache cell; cells missing from the
+    cache are fetched together in multi-coordinate chunks (in parallel).
+    """
+    keys = [location_key(f"{lat},{lon}") for lat, lon in points]
+    found: Dict[str, Optional[Dict[str, Any]]] = {}
+    missing: Dict[str, Tuple[float, float]] = {}
+    for key, point in zip(keys, points):
+        if key in found or key in missing:
+            continue
+        hit, value = series_cache.get(kind, key)
+        if hit:
+            found[key] = value
+        else:
+            missing[key] = point
+    # cells another request is already fetching are waited on, not fetched again
+    todo, waiting = [], {}
+    for key, point in missing.items():
+        leader, call = flights.begin("open_meteo_" + kind, key)
+        if leader:
+            # a flight may have landed between the cache check and begin()
+            hit, value = series_cache.peek(kind, key)
+            if hit:
+                found[key] = value
+                flights.finish("open_meteo_" + kind, key, call, result=value)
+            else:
+                todo.append((key, point, call))
+        else:
+            waiting[key] = call
+    chunk = settings.AQI_BATCH_CHUNK
+    parts = [todo[k:k + chunk] for k in range(0, len(todo), chunk)]
+    error = None
+    if parts:
+        with ThreadPoolExecutor(max_workers=min(len(parts), settings.ROUTE_MAX_IN_FLIGHT)) as pool:
+            futures = [pool.submit(_fetch, kind, [p for _, p, _ in part]) for part in parts]
+            for part, future in zip(parts, futures):
+                try:
+                    results = future.result()
+                except Exception as e:
+                    error = error or e
+                    for key, _, call in part:
+                        flights.finish("open_meteo_" + kind, key, call, error=e)
+                    continue
+                for i, (key, _, call) in enumerate(part):
+                    series = results[i] if i < len(results) else None
+                    found[key] = series
+                    if series is not None:
+                        series_cache.put(kind, key, series)
+                    flights.finish("open_meteo_" + kind, key, call, result=series)
+    if error is not None:
+        raise error
+    for key, call in waiting.items():
+        found[key] = flights.wait("open_meteo_" + kind, key, call, timeout=http_client.max_call_time("open_meteo"))
+    return [found.get(key) for key in keys]
+
+def current(kind: str, lat: float, lon: float) -> Dict[str, Any]:
+    """Current-hour values of every variable of `kind` at (lat, lon)."""
+    series = get_many(kind, [(float(lat), float(lon))])[0]
+    if series is None:
+        raise FetchError(f"{kind} data unavailable for {lat},{lon}")
+    return at_current_hour(series)
+
+def current_many(kind: str, points: Sequence[Tuple[float, float]]) -> List[Optional[Dict[str, Any]]]:
+    now = datetime.utcnow()
+    return [at_current_hour(s, now) if s is not None else None for s in get_many(kind, points)]
@@ -0,0 +1,167 @@
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from config import get_settings
+from exceptions import CircuitOpenError
+
+settings = get_settings()
+
+# provider -> hosts it serves and its request timeout (seconds)
+PROVIDERS: Dict[str, Dict[str, Any]] = {
+    "waqi": {
+        "hosts": ("api.waqi.info",),
+        "timeout": settings.REQUEST_TIMEOUT,
+    },
+    "open_meteo": {
+        "hosts": ("api.open-meteo.com", "air-quality-api.open-meteo.com", "geocoding-api.open-meteo.com"),
+        "timeout": 15.0,
+    },
+    "openaq": {
+        "hosts": ("api.openaq.org",),
+        "timeout": 20.0,
+    },
+    "nominatim": {
+        "hosts": ("nominatim.openstreetmap.org",),
+        "timeout": settings.REQUEST_TIMEOUT,
+    },
+    "gemini": {
+        "hosts": ("generativelanguage.googleapis.com",),
+        "timeout": 30.0,
+    },
+}
+DEFAULT_PROVIDER = "default"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# transport errors worth another attempt; any other RequestException is counted but not retried
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+class CircuitBreaker:
+    """
+    Per-provider breaker. After `threshold` consecutive failures the circuit opens
+    and calls fail fast for `reset_timeout` seconds, then one trial call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+    def __init__(self, name: str, threshold: int, reset_timeout: float):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_in_flight:
+                raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return "open"
+            return "half_open"
+
+def _build_session() -> requests.Session:
+    # one keep-alive pool per host, shared by every thread
+    sess = requests.Session()
+    adapter = HTTPAdapter(pool_connections=len(PROVIDERS) * 2, pool_maxsize=settings.HTTP_POOL_SIZE)
+    sess.mount("https://", adapter)
+    sess.mount("http://", adapter)
+    return sess
+
+_session = _build_session()
+_breakers: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(name, settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_TIMEOUT)
+    for name in list(PROVIDERS) + [DEFAULT_PROVIDER]
+}
+
+def provider_for_url(url: str) -> str:
+    host = urlparse(url).hostname or ""
+    for name, conf in PROVIDERS.items():
+        if host in conf["hosts"]:
+            return name
+    return DEFAULT_PROVIDER
+
+def max_call_time(provider: str, timeout: Optional[float] = None) -> float:
+    """Upper bound on request()'s duration for an idempotent call: every attempt timing out plus the longest backoffs."""
+    if timeout is None:
+        timeout = PROVIDERS.get(provider, {}).get("timeout", settings.REQUEST_TIMEOUT)
+    retries = settings.HTTP_MAX_RETRIES
+    return timeout * (retries + 1) + sum(settings.HTTP_BACKOFF_BASE * (2 ** a) for a in range(retries))
+
+def _backoff(attempt: int) -> float:
+    # exponential backoff with full jitter
+    return random.uniform(0, settings.HTTP_BACKOFF_BASE * (2 ** attempt))
+
+def request(method: str, url: str, provider: Optional[str] = None,
+            timeout: Optional[float] = None, idempotent: Optional[bool] = None,
+            **kwargs) -> requests.Response:
+    """
+    Sends a request through the shared pooled session.
+    - provider: key in PROVIDERS (inferred from the URL host if omitted)
+    - timeout: overrides the provider's timeout
+    - idempotent: retry on connection errors / timeouts / 429 / 5xx (defaults to True for GET)
+    Raises CircuitOpenError when the provider's breaker is open, otherwise the
+    usual requests exceptions (call raise_for_status() on the result as before).
+    """
+    provider = provider or provider_for_url(url)
+    conf = PROVIDERS.get(provider, {})
+    if timeout is None:
+        timeout = conf.get("timeout", settings.REQUEST_TIMEOUT)
+    if idempotent is None:
+        idempotent = method.upper() == "GET"
+    retries = settings.HTTP_MAX_RETRIES if idempotent else 0
+    breaker = _breakers[provider if provider in _breakers else DEFAULT_PROVIDER]
+
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            resp = _session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            # every failure must reach the breaker, or a failed half-open trial keeps it open
+            breaker.record_failure()
+            if attempt >= retries or not isinstance(e, RETRY_EXCEPTIONS):
+                raise
+        else:
+            if resp.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return resp
+            breaker.record_failure()
+            if attempt >= retries:
+                return resp
+        time.sleep(_backoff(attempt))
+        attempt += 1
+
+def get(url: str, params=None, headers=None, provider: Optional[str] = None,
+        timeout: Optional[float] = None) -> requests.Response:
+    return request("GET", url, provider=provider, timeout=timeout, params=params, headers=headers)
+
+def post(url: str, json=None, headers=None, provider: Optional[str] = None,
+         timeout: Optional[float] = None, idempotent: bool = False) -> requests.Response:
+    return request("POST", url, provider=provider, timeout=timeout, idempotent=idempotent,
+                   json=json, headers=headers)
+
+def breaker_states() -> Dict[str, str]:
+    return {name: b.state() for name, b in _breakers.items()}
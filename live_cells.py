@@ -0,0 +1,164 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import http_client
+import hourly_series
+from config import get_settings
+from geo_cache import location_key
+from singleflight import flights
+
+settings = get_settings()
+# payload field -> (hourly series kind, Open-Meteo variable)
+LIVE_FIELDS = {
+    "aqi": ("air_quality", "us_aqi"),
+    "pm25": ("air_quality", "pm2_5"),
+    "pm10": ("air_quality", "pm10"),
+    "temp": ("weather", "temperature_2m"),
+    "humidity": ("weather", "relativehumidity_2m"),
+    "windSpeed": ("weather", "windspeed_10m"),
+    "weathercode": ("weather", "weathercode"),
+}
+
+def cell_room(cell: str) -> str:
+    return "cell:" + cell.split(":", 1)[1]
+
+class LiveCellUpdater:
+    """
+    Shared live conditions per geohash cell.
+
+    Clients subscribe to the cell of their coordinates (one Socket.IO room per
+    cell). A background thread fetches each cell with at least one subscriber
+    once per LIVE_CELL_INTERVAL from the shared hourly series and broadcasts to
+    the room only the fields that changed, so upstream calls scale with the
+    number of active cells, not with connected clients. A cell with no values
+    yet (first subscriber) is fetched right away and sent to the subscriber.
+    """
+    def __init__(self, emit: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        self.emit = emit
+        self.interval = settings.LIVE_CELL_INTERVAL
+        self._cell_of: Dict[str, str] = {}
+        self._members: Dict[str, Set[str]] = {}
+        self._points: Dict[str, Tuple[float, float]] = {}
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._prime_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="live-cell-prime")
+
+    def subscribe(self, sid: str, lat: float, lon: float) -> Tuple[Optional[str], str, Dict[str, Any]]:
+        """
+        Moves `sid` to the cell of (lat, lon). Returns (previous room or None,
+        new room, last known values of the new cell) so the caller can switch
+        rooms and send the snapshot to this client alone. If the cell has no
+        values yet they are fetched in the background and emitted to `sid`.
+        """
+        cell = location_key(f"{lat},{lon}")
+        with self._lock:
+            previous = self._remove(sid)
+            self._cell_of[sid] = cell
+            self._members.setdefault(cell, set()).add(sid)
+            self._points.setdefault(cell, (float(lat), float(lon)))
+            snapshot = dict(self._last.get(cell) or {})
+        if not snapshot:
+            self._prime_pool.submit(self._prime, sid, cell)
+        return (cell_room(previous) if previous and previous != cell else None), cell_room(cell), snapshot
+
+    def unsubscribe(self, sid: str) -> Optional[str]:
+        with self._lock:
+            cell = self._remove(sid)
+        return cell_room(cell) if cell else None
+
+    def _remove(self, sid: str) -> Optional[str]:
+        # caller holds the lock; forgets cells nobody watches any more
+        cell = self._cell_of.pop(sid, None)
+        if cell is not None:
+            members = self._members.get(cell)
+            if members is not None:
+                members.discard(sid)
+                if not members:
+                    del self._members[cell]
+                    self._points.pop(cell, None)
+                    self._last.pop(cell, None)
+        return cell
+
+    @staticmethod
+    def _fetch(cells: List[str], points: List[Tuple[float, float]]) -> Dict[str, Dict[str, Any]]:
+        values: Dict[str, Dict[str, Any]] = {c: {} for c in cells}
+        for kind in {k for k, _ in LIVE_FIELDS.values()}:
+            for cell, now in zip(cells, hourly_series.current_many(kind, points)):
+                if not now:
+                    continue
+                for field, (field_kind, var) in LIVE_FIELDS.items():
+                    if field_kind == kind:
+                        values[cell][field] = now.get(var)
+        return values
+
+    def _prime(self, sid: str, cell: str) -> None:
+        """First values of a new cell, sent to `sid`; concurrent subscribers share one fetch."""
+        with self._lock:
+            point = self._points.get(cell)
+            values = dict(self._last.get(cell) or {})
+        if point is None:
+            return
+        if not values:
+            try:
+                # one Open-Meteo call per series kind
+                bound = len(hourly_series.SERIES) * http_client.max_call_time("open_meteo")
+                values = flights.do("live_cell", cell, lambda: self._fetch([cell], [point])[cell], timeout=bound)
+            except Exception as e:
+                print(f"Live cell prime failed for {cell}: {e}")
+                return
+        with self._lock:
+            if self._cell_of.get(sid) != cell:
+                return
+            last = self._last.setdefault(cell, {})
+            last.update(values)
+            snapshot = dict(last)
+        if snapshot and self.emit is not None:
+            self.emit(sid, {"cell": cell.split(":", 1)[1], "changes": snapshot, "snapshot": True,
+                            "timestamp": datetime.utcnow().isoformat()})
+
+    def refresh(self) -> Dict[str, int]:
+        """One pass over the active cells; returns how many were fetched and broadcast."""
+        with self._lock:
+            cells = list(self._members)
+            points = [self._points[c] for c in cells]
+        if not cells:
+            return {"cells": 0, "broadcasts": 0}
+        values = self._fetch(cells, points)
+        broadcasts = 0
+        stamp = datetime.utcnow().isoformat()
+        for cell in cells:
+            with self._lock:
+                if cell not in self._members:
+                    continue
+                last = self._last.setdefault(cell, {})
+                changes = {k: v for k, v in values[cell].items() if last.get(k) != v}
+                last.update(changes)
+            if changes and self.emit is not None:
+                self.emit(cell_room(cell), {"cell": cell.split(":", 1)[1], "changes": changes, "timestamp": stamp})
+                broadcasts += 1
+        return {"cells": len(cells), "broadcasts": broadcasts}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"cells": len(self._members), "subscribers": len(self._cell_of)}
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Live cell refresh failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="live-cells", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+updater = LiveCellUpdater()
@@ -0,0 +1,190 @@
+import bisect
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+import numpy as np
+from scipy.spatial import cKDTree
+from config import get_settings
+
+settings = get_settings()
+EARTH_RADIUS_M = 6371008.8
+
+def normalize_name(text: str) -> str:
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", (text or "").lower()).split())
+
+def _unit_vectors(lats, lons) -> np.ndarray:
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lon = np.radians(np.asarray(lons, dtype=float))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+class LocationIndex:
+    """
+    Local index of OpenAQ locations for one country.
+
+    Stored on disk as gzipped columnar JSON (ids / lats / lons / names / localities).
+    Answers city lookups from a normalized-name dict plus a sorted token list for
+    prefix matches, and nearest-station lookups from a KD-tree on unit vectors.
+    Rows are upserted by id, so refreshes and network fallbacks merge into it;
+    the lookup structures are rebuilt once by the next query after any upserts.
+    """
+    def __init__(self, iso: str, path: Path):
+        self.iso = iso
+        self.path = path
+        self.updated_at = 0.0
+        self._rows: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # one save at a time, so concurrent savers don't share the temp file
+        self._save_lock = threading.Lock()
+        self._rebuild()
+        self.load()
+
+    # ---- persistence
+    def load(self) -> None:
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return
+        cols = raw.get("columns") or {}
+        rows = [
+            {"id": i, "lat": la, "lon": lo, "name": n, "locality": loc}
+            for i, la, lo, n, loc in zip(cols.get("id", []), cols.get("lat", []), cols.get("lon", []),
+                                         cols.get("name", []), cols.get("locality", []))
+        ]
+        with self._lock:
+            self._rows = {r["id"]: r for r in rows}
+            self.updated_at = float(raw.get("updated_at") or 0.0)
+            self._rebuild()
+
+    def save(self) -> None:
+        with self._save_lock:
+            self._save()
+
+    def _save(self) -> None:
+        with self._lock:
+            rows = list(self._rows.values())
+            payload = {
+                "iso": self.iso,
+                "updated_at": self.updated_at,
+                "columns": {
+                    "id": [r["id"] for r in rows],
+                    "lat": [r["lat"] for r in rows],
+                    "lon": [r["lon"] for r in rows],
+                    "name": [r["name"] for r in rows],
+                    "locality": [r["locality"] for r in rows],
+                }
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    # ---- updates
+    def upsert(self, locations: Iterable[Dict[str, Any]], refreshed: bool = False) -> int:
+        """Merges raw OpenAQ /locations results; returns how many rows were added or changed."""
+        changed = 0
+        with self._lock:
+            for loc in locations:
+                coords = loc.get("coordinates") or {}
+                if loc.get("id") is None or coords.get("latitude") is None or coords.get("longitude") is None:
+                    continue
+                row = {
+                    "id": int(loc["id"]),
+                    "lat": float(coords["latitude"]),
+                    "lon": float(coords["longitude"]),
+                    "name": loc.get("name") or "",
+                    "locality": loc.get("locality") or "",
+                }
+                if self._rows.get(row["id"]) != row:
+                    self._rows[row["id"]] = row
+                    changed += 1
+            if refreshed:
+                self.updated_at = time.time()
+            if changed:
+                self._dirty = True
+        return changed
+
+    def _ensure_built(self) -> None:
+        # caller holds the lock
+        if self._dirty:
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        # caller holds the lock (or is __init__)
+        self._dirty = False
+        rows = list(self._rows.values())
+        self._ids = np.array([r["id"] for r in rows], dtype=np.int64)
+        self._tree = cKDTree(_unit_vectors([r["lat"] for r in rows], [r["lon"] for r in rows])) if rows else None
+        self._by_name: Dict[str, int] = {}
+        tokens = []
+        for r in sorted(rows, key=lambda r: r["id"]):
+            for field in (r["name"], r["locality"]):
+                norm = normalize_name(field)
+                if not norm:
+                    continue
+                self._by_name.setdefault(norm, r["id"])
+                # every word-suffix, so a prefix search matches at any word boundary
+                words = norm.split()
+                for k in range(len(words)):
+                    tokens.append((" ".join(words[k:]), r["id"]))
+        tokens.sort()
+        self._tokens = tokens
+        self._token_keys = [t[0] for t in tokens]
+        self._haystack = [(r["id"], normalize_name(r["name"]), normalize_name(r["locality"])) for r in rows]
+
+    # ---- queries
+    def is_stale(self) -> bool:
+        return not self._rows or time.time() - self.updated_at > settings.LOCATION_INDEX_MAX_AGE
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def find_by_name(self, city: str) -> Optional[int]:
+        """Exact normalized name/locality, then prefix at a word boundary, then substring match."""
+        q = normalize_name(city)
+        if not q:
+            return None
+        with self._lock:
+            self._ensure_built()
+            hit = self._by_name.get(q)
+            if hit is not None:
+                return hit
+            i = bisect.bisect_left(self._token_keys, q)
+            if i < len(self._token_keys) and self._token_keys[i].startswith(q):
+                return self._tokens[i][1]
+            for loc_id, name, locality in self._haystack:
+                if q in name or q in locality:
+                    return loc_id
+        return None
+
+    def coords(self, loc_id: int) -> Optional[Tuple[float, float]]:
+        with self._lock:
+            row = self._rows.get(loc_id)
+        return (row["lat"], row["lon"]) if row else None
+
+    def nearest(self, lat: float, lon: float, radius_m: float) -> Optional[int]:
+        with self._lock:
+            self._ensure_built()
+            if self._tree is None:
+                return None
+            chord = 2 * np.sin(min(radius_m / EARTH_RADIUS_M, np.pi) / 2)
+            dist, idx = self._tree.query(_unit_vectors([lat], [lon])[0], distance_upper_bound=chord)
+            if not np.isfinite(dist):
+                return None
+            return int(self._ids[idx])
+
+_indexes: Dict[str, LocationIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_index(iso: str = "IN") -> LocationIndex:
+    with _indexes_lock:
+        if iso not in _indexes:
+            path = Path(settings.CACHE_DIR) / f"openaq_locations_{iso.lower()}.json.gz"
+            _indexes[iso] = LocationIndex(iso, path)
+        return _indexes[iso]
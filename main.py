@@ -1,19 +1,40 @@
 import os
+# green-thread serving: sockets, threads and locks must be patched before anything else
+# imports them, so the mode is read from the process environment (not .env) up front
+if os.getenv("SERVER_ASYNC_MODE", "threading") == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+import threading
+import uuid
 from pathlib import Path
 from datetime import datetime
 from flask import Flask, request, jsonify, send_from_directory, redirect, session
 from flask_cors import CORS
-import requests
+from config import get_settings
+from green import patched
+import http_client
 from dotenv import load_dotenv
 import db
-from flask_socketio import SocketIO, emit, join_room
-from advisor import create_aqi_chat_agent, user_chat, build_initial_context
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from advisor import chat_pool
 from realtime_aqi import realtime_aqi
-from realtime_weather import realtime_weather, geocode_city_to_latlon
-from analyzer import save_analysis_to_file, geminiForAnalysis, fetch_results
-import json
+from geo_cache import aqi_cache, location_key
+from analysis_cache import analysis_cache
+from forecaster import forecast_points
+import hourly_series
+from gazetteer import reverse_geocode, place_name, remote_cache
+from exceptions import FetchError
+from singleflight import flights
+from realtime_weather import realtime_weather
+import geocoder
+from analyzer import refresh_analysis_async, geminiForAnalysis, fetch_results, structured
+from analysis_store import analysis_store
+from recommendations import compute_route_exposure, store as recommendation_store, scheduler as precompute_scheduler
+from alerts import engine as alert_engine
+from live_cells import updater as live_cells
 load_dotenv()
 db.config()
+db.ensureRouteTokenColumn()
 BASE_DIR = Path(__file__).resolve().parent
 FRONTEND_DIRS = [
     BASE_DIR / "frontend" / "dist",
@@ -32,38 +53,24 @@ app.secret_key = '$&@(*FH#%&RUIF#%())'
 socketio = SocketIO(
     app,
     cors_allowed_origins="*",
-    async_mode='threading'
+    async_mode="eventlet" if patched() else "threading"
 )
 # ---- Helpers ----
 def error_json(message, status=500):
     return jsonify({"error": message}), status
 
-def reverse_geocode(lat, lon):
-    url = f"https://nominatim.openstreetmap.org/reverse?format=json&lat={lat}&lon={lon}"
-    r = requests.get(url, headers={"User-Agent": "AirAware"})
-    if r.status_code == 200:
-        data = r.json()
-        return (
-            data.get("address", {}).get("city") or
-            data.get("address", {}).get("town") or
-            data.get("address", {}).get("village") or
-            data.get("display_name")
-        )
-    return "Unknown"
-
-def call_get(url, params=None, timeout=15):
-    try:
-        resp = requests.get(url, params=params, timeout=timeout)
-        resp.raise_for_status()
-        return resp.json()
-    except requests.HTTPError as he:
-        # return HTTP error JSON where possible
-        raise
-    except Exception:
-        # bubble up for general handling
-        raise
 # SocketIO Routes
 
+# threshold alerts go to the user's room (see handle_join)
+alert_engine.emit = lambda user_id, alert: socketio.emit('aqi_alert', alert, room=user_id)
+# live conditions are broadcast once per location cell to everyone subscribed to it
+# (a single sid is also a room, for the first values of a new cell)
+live_cells.emit = lambda room, update: socketio.emit('cell_update', update, room=room)
+# keep forecasts warm for the cells the alert engine reads its forecast peak from
+if get_settings().FORECAST_PREWARM_INTERVAL > 0:
+    precompute_scheduler.add_job("forecast_prewarm", lambda: forecast_points(alert_engine.cells()),
+                                 get_settings().FORECAST_PREWARM_INTERVAL)
+
 @socketio.on('connect')
 def handle_connect():
     print(f'Client connected: {request.sid}')
@@ -72,6 +79,12 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print(f'Client disconnected: {request.sid}')
+    live_cells.unsubscribe(request.sid)
+    # stop generating replies nobody will receive
+    with _streams_lock:
+        for sid, cancel in _active_streams.values():
+            if sid == request.sid:
+                cancel.set()
 
 @socketio.on('join')
 def handle_join(data):
@@ -79,6 +92,25 @@ def handle_join(data):
     if user_id:
         join_room(user_id)
         print(f'User {user_id} joined room')
+@socketio.on('subscribe_cell')
+def handle_subscribe_cell(data):
+    """
+    Joins the room of the location cell around { lat, lon } (leaving the
+    previous one) and sends the cell's last known values to this client.
+    """
+    try:
+        lat, lon = float(data.get('lat')), float(data.get('lon'))
+    except (TypeError, ValueError):
+        emit('error', {'message': 'lat and lon are required'})
+        return
+    previous, room, snapshot = live_cells.subscribe(request.sid, lat, lon)
+    if previous:
+        leave_room(previous)
+    join_room(room)
+    # a brand-new cell has no values yet; live_cells sends them to this sid once fetched
+    if snapshot:
+        emit('cell_update', {'cell': room.split(':', 1)[1], 'changes': snapshot, 'snapshot': True})
+
 @socketio.on('user_message')
 def handle_user_message(data):
     """
@@ -89,12 +121,7 @@ def handle_user_message(data):
     
     user_id = data.get('userId')
     text = data.get('text', '')
-    meta = data.get('meta', {})
-    with open(f"analysis_outputs/analysis_{user_id}.json", "r") as f:
-        analysis_json = json.load(f)
-    chat = create_aqi_chat_agent(analysis_json)
-    data = user_chat(chat, text)
-    
+    meta = data.get('meta') or {}
     if not text:
         emit('assistant_message', {
             'text': 'Please provide a message.',
@@ -102,12 +129,110 @@ def handle_user_message(data):
             'from': 'assistant',
             'error': True
         })
+        return
+    record = analysis_store.get(user_id)
+    if record is None:
+        # first message without an analysis: build it in the background and answer once it exists
+        _answer_when_analysed(user_id, request.sid, text)
+        emit('assistant_message', {
+            'text': 'Preparing your air-quality analysis, the answer will follow shortly.',
+            'timestamp': datetime.utcnow().isoformat(),
+            'from': 'assistant',
+            'pending': True
+        })
+        return
+    analysis_json = record.analysis
+    if meta.get('stream', get_settings().CHAT_STREAMING):
+        _start_stream(user_id, analysis_json, text)
+        return
+    # reuses the user's primed chat unless their analysis changed
+    data = chat_pool.send(user_id, analysis_json, text)
     
     emit('assistant_message', {
                 'text': data,
                 'timestamp': datetime.utcnow().isoformat(),
                 'from': 'assistant'
             })
+
+def _answer_when_analysed(user_id, sid, text):
+    room = user_id or sid
+
+    def on_done(result):
+        if isinstance(result, Exception):
+            print(f"Analysis for {user_id} failed: {result}")
+            socketio.emit('assistant_message', {
+                'text': 'Sorry, your air-quality analysis could not be prepared right now.',
+                'timestamp': datetime.utcnow().isoformat(),
+                'from': 'assistant',
+                'error': True
+            }, to=room)
+            return
+        try:
+            reply = chat_pool.send(user_id, result.analysis, text)
+        except Exception as e:
+            print(f"Reply for {user_id} failed: {e}")
+            return
+        socketio.emit('assistant_message', {
+            'text': reply,
+            'timestamp': datetime.utcnow().isoformat(),
+            'from': 'assistant'
+        }, to=room)
+    refresh_analysis_async(user_id, on_done)
+
+# in-flight streamed replies: user (or sid) -> (sid, cancel event)
+_active_streams = {}
+_streams_lock = threading.Lock()
+
+def _start_stream(user_id, analysis_json, text):
+    """
+    Streams the reply as assistant_delta events followed by assistant_done,
+    to the user's room (or just this client when there is no userId).
+    A newer message from the same user cancels the reply still in progress.
+    """
+    sid = request.sid
+    key = user_id or sid
+    room = user_id or sid
+    stream_id = uuid.uuid4().hex
+    cancel = threading.Event()
+    with _streams_lock:
+        previous = _active_streams.get(key)
+        if previous:
+            previous[1].set()
+        _active_streams[key] = (sid, cancel)
+
+    def run():
+        parts = []
+        try:
+            for index, chunk in enumerate(chat_pool.stream(user_id or sid, analysis_json, text, cancel)):
+                parts.append(chunk)
+                socketio.emit('assistant_delta', {
+                    'streamId': stream_id,
+                    'index': index,
+                    'text': chunk,
+                    'from': 'assistant'
+                }, to=room)
+            socketio.emit('assistant_done', {
+                'streamId': stream_id,
+                'text': ''.join(parts),
+                'cancelled': cancel.is_set(),
+                'timestamp': datetime.utcnow().isoformat(),
+                'from': 'assistant'
+            }, to=room)
+        except Exception as e:
+            socketio.emit('assistant_done', {
+                'streamId': stream_id,
+                'text': ''.join(parts),
+                'timestamp': datetime.utcnow().isoformat(),
+                'from': 'assistant',
+                'error': str(e)
+            }, to=room)
+        finally:
+            with _streams_lock:
+                if _active_streams.get(key, (None, None))[1] is cancel:
+                    del _active_streams[key]
+
+    socketio.start_background_task(run)
+
 # ---- Static + multipage routing ----
 if STATIC_DIR:
     STATIC_DIR = STATIC_DIR.resolve()
@@ -173,6 +298,23 @@ def api_signup():
     except Exception as e:
         return error_json(str(e), 400)
 
+def _fill_route_coords(user_id, route_token, results):
+    start_latlon, end_latlon = [latlon or (None, None) for latlon in results]
+    try:
+        # a newer onboarding replaced the token; its places win over these
+        if not db.updateRouteCoords(user_id, start_latlon[0], start_latlon[1],
+                                    end_latlon[0], end_latlon[1], route_token):
+            print(f"Skipping stale route coordinates for {user_id}")
+            return
+    except Exception as e:
+        print(f"Saving route coordinates for {user_id} failed: {e}")
+        return
+    socketio.emit('route_geocoded', {
+        'routeStart': {'lat': start_latlon[0], 'lng': start_latlon[1]},
+        'routeEnd': {'lat': end_latlon[0], 'lng': end_latlon[1]},
+        'complete': all(results)
+    }, room=user_id)
+
 @app.route("/api/onboarding", methods=["POST"])
 def api_onboarding():
     try:
@@ -187,19 +329,34 @@ def api_onboarding():
         enable_notifications = data.get("enableNotifications", True)
         route_start = data.get('routeStart')
         route_end = data.get('routeEnd')
-        start_latlon = geocode_city_to_latlon(route_start)
-        end_latlon = geocode_city_to_latlon(route_end)
-        print(start_latlon[0], end_latlon[0])
+        places = [route_start, route_end]
+        hits = [geocoder.cached(p) for p in places]
+        geocode_later = (data.get("asyncGeocode", get_settings().ONBOARDING_ASYNC_GEOCODE)
+                         and not all(found and latlon for found, latlon in hits))
+        if geocode_later:
+            # save the profile now; route coordinates are filled in once the queue reaches them
+            start_latlon = end_latlon = (None, None)
+        else:
+            start_latlon, end_latlon = [latlon if found and latlon else geocoder.geocode(p)
+                                        for p, (found, latlon) in zip(places, hits)]
         route_start_lat = start_latlon[0]
         route_end_lat = end_latlon[0]
         route_start_lng = start_latlon[1]
         route_end_lng = end_latlon[1]
+        # every onboarding replaces the token, so only the latest queued fill can land
+        route_token = uuid.uuid4().hex if geocode_later else None
         db.updateOnboarding(user_id, location, age_group, is_sensitive,
                      morning_summary, threshold_alerts, commute_alerts,
-                     enable_notifications, route_start_lat, route_start_lng, 
-           route_end_lat, route_end_lng)
+                     enable_notifications, route_start_lat, route_start_lng,
+               route_end_lat, route_end_lng, route_token)
+        if geocode_later:
+            geocoder.geocode_many_async(places, lambda results: _fill_route_coords(user_id, route_token, results))
 
-        return jsonify({"success": True, "message": "Onboarding updated!"})
+        return jsonify({
+            "success": True,
+            "message": "Onboarding updated!",
+            "geocoding": "pending" if geocode_later else "done"
+        })
 
     except Exception as e:
         print(e)
@@ -213,14 +370,14 @@ def api_login():
         email = data.get("email")
         password = data.get("password")
         user = db.showField("email", email)[0]
-        if user[4] == password:
-            session["username"] = user[0]
+        if user.password == password:
+            session["username"] = user.username
             return jsonify({
             "success": True,
             "message": "Login successful",
             "user": {
                 "email": email,
-                "username": user[0]
+                "username": user.username
             }
         })
     except Exception as e:
@@ -243,55 +400,42 @@ def api_profile():
     user = user[0]
 
     result = {
-        "username": user[0],
-        "email": user[1],
-        "location": user[7],
-        "age_group": user[5],
-        "firstname": user[2],
-        "lastname": user[3],
-        "is_sensitive": bool(user[6]),
+        "username": user.username,
+        "email": user.email,
+        "location": user.location,
+        "age_group": user.age_group,
+        "firstname": user.first_name,
+        "lastname": user.last_name,
+        "is_sensitive": bool(user.is_sensitive),
     }
     return jsonify(result)
 @app.route("/api/recommendations/route-exposure", methods=["GET"])
 def api_route_exposure():
     """
     Returns route‑exposure recommendations to the frontend.
-    You will later populate the response.
+    Served from the precomputed store; the pipeline only runs inline when the
+    user has no result yet, and stale results trigger a background refresh.
     """
-    user = db.showField('username', session['username'])[0]
-
-    USER_DATA = {
-   'Name': user[2] + ' ' + user[3],
-   'Age': user[5],
-   'Health_Issues': user[6],
-   'Residence': user[7],
-    }
-    start_latlon = (user[8], user[9])
-    end_latlon = (user[10], user[11])
-    USER_ROUTE = [
-        start_latlon, end_latlon
-    ]
-    save_analysis_to_file(user_id=user[0])
-    with open(f"analysis_outputs/analysis_{user[0]}.json", "r") as f:
-        analysis_json = json.load(f)
-
-    chat = create_aqi_chat_agent(analysis_json)
-    oneliner = user_chat(chat, 'Based off all the details give me detailed advice for today in one single sentence, without any formatting')
+    username = session['username']
     try:
-        # You will replace this dictionary with your real data.
-        dummy_response = {
-    "success": True,
-  "riskLevel": "High",
-  "distanceFactor": 0.85,
-  "advice": 
-    oneliner
-  ,
-  "timestamp": datetime.now()
-}
-
+        latest = recommendation_store.get(username)
+        if latest is None:
+            recommendation_store.put(username, compute_route_exposure(username))
+            latest = recommendation_store.get(username)
+        elif latest[1] > precompute_scheduler.max_age:
+            precompute_scheduler.refresh(username)
+        result, age, computed_at = latest
 
-        return jsonify(dummy_response)
+        return jsonify({
+            "success": True,
+            **result,
+            "timestamp": computed_at,
+            "ageSeconds": round(age, 1)
+        })
 
+    except FetchError as fe:
+        # upstream failure or a model answer that stayed invalid after repair
+        return error_json(str(fe), 502)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -304,37 +448,8 @@ def api_weather():
         if not lat or not lon:
             return error_json("Missing coordinates", 400)
 
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            "current_weather": True,
-            # request hourly humidity and apparent_temperature (apparent temp key is 'apparent_temperature')
-            "hourly": ["relativehumidity_2m", "apparent_temperature", "weathercode"],
-            "timezone": "auto"
-        }
-
-        data = call_get(url, params=params)
-
-        current = data.get("current_weather", {})
-        hourly = data.get("hourly", {})
-
-        # Safely find index of current time in hourly.time (fallback to 0)
-        def find_index():
-            try:
-                return hourly.get("time", []).index(current.get("time"))
-            except Exception:
-                return 0
-
-        idx = find_index()
-
-        def safe_at(list_or_none, i=idx):
-            if isinstance(list_or_none, list) and len(list_or_none) > i:
-                return list_or_none[i]
-            return None
-
-        humidity = safe_at(hourly.get("relativehumidity_2m"))
-        feels_like = safe_at(hourly.get("apparent_temperature"))
+        # current local hour from the shared per-cell hourly series
+        now = hourly_series.current("weather", lat, lon)
 
         # Simple mapping from weathercode to human label (extend as needed)
         weather_map = {
@@ -349,15 +464,15 @@ def api_weather():
             71: "Light snow",
             80: "Rain showers"
         }
-        condition = weather_map.get(current.get("weathercode"), "Unknown")
+        condition = weather_map.get(now.get("weathercode"), "Unknown")
 
         return jsonify({
-            "temp": current.get("temperature"),
-            "feelsLike": feels_like,
-            "humidity": humidity,
-            "windSpeed": current.get("windspeed"),
+            "temp": now.get("temperature_2m"),
+            "feelsLike": now.get("apparent_temperature"),
+            "humidity": now.get("relativehumidity_2m"),
+            "windSpeed": now.get("windspeed_10m"),
             "description": condition,
-            "time": current.get("time")
+            "time": now.get("time")
         })
     except Exception as e:
         return error_json(str(e), 500)
@@ -371,23 +486,37 @@ def api_location():
         if not lat or not lon:
             return error_json("Missing coordinates", 400)
 
-        url = "https://geocoding-api.open-meteo.com/v1/reverse"
-        params = {"latitude": lat, "longitude": lon, "count": 1}
-        data = call_get(url, params=params)
-        results = data.get("results") or []
-        if not results:
+        # bundled gazetteer first; only points far from every known place go remote
+        loc = reverse_geocode(lat, lon, wait=True)
+        if not loc:
             return error_json("Location not found", 404)
-        loc = results[0]
         return jsonify({
-            "city": loc.get("name"),
+            "city": loc.get("city"),
             "country": loc.get("country"),
-            "lat": loc.get("latitude"),
-            "lon": loc.get("longitude")
+            "lat": loc.get("lat"),
+            "lon": loc.get("lon")
         })
+    except FetchError as fe:
+        return error_json(str(fe), 502)
     except Exception as e:
         return error_json(str(e), 500)
 
 # ---- AQI (Open‑Meteo Air Quality) ----
+# response field -> Open-Meteo hourly variable
+AIR_QUALITY_FIELDS = {
+    "aqi": "us_aqi",
+    "pm25": "pm2_5",
+    "pm10": "pm10",
+    "co": "carbon_monoxide",
+    "no2": "nitrogen_dioxide",
+    "o3": "ozone",
+    "so2": "sulphur_dioxide",
+    "time": "time"
+}
+
+def _air_quality_fields(now):
+    return {field: now.get(var) for field, var in AIR_QUALITY_FIELDS.items()}
+
 @app.route("/api/aqi", methods=["GET"])
 def api_aqi():
     try:
@@ -396,51 +525,91 @@ def api_aqi():
         if not lat or not lon:
             return error_json("Missing coordinates", 400)
 
-        url = "https://air-quality-api.open-meteo.com/v1/air-quality"
-        params = {
-            "latitude": lat,
-            "longitude": lon,
-            # pass hourly as list (requests will encode multiple hourly parameters)
-            "hourly": [
-                "us_aqi",
-                "pm10",
-                "pm2_5",
-                "carbon_monoxide",
-                "nitrogen_dioxide",
-                "ozone",
-                "sulphur_dioxide"
-            ],
-            "timezone": "auto"
-        }
+        # values for the current local hour from the shared per-cell hourly series
+        result = _air_quality_fields(hourly_series.current("air_quality", lat, lon))
+        # local gazetteer lookup; a remote fallback never blocks this response
+        return jsonify({"location": place_name(lat, lon), **result})
+    except FetchError as fe:
+        return error_json(str(fe), 502)
+    except Exception as e:
+        return error_json(str(e), 500)
 
-        data = call_get(url, params=params)
-
-        # If API returns an error
-        if data.get("error"):
-            reason = data.get("reason") or "AQI data unavailable"
-            return error_json(reason, 502)
-
-        hourly = data.get("hourly", {})
-
-        # helper for safe extraction
-        def safe(arr):
-            return arr[0] if isinstance(arr, list) and len(arr) > 0 else None
-        location_name = reverse_geocode(lat, lon)
-        result = {
-            "location": location_name,
-            "aqi": safe(hourly.get("us_aqi")),
-            "pm25": safe(hourly.get("pm2_5")),
-            "pm10": safe(hourly.get("pm10")),
-            "co": safe(hourly.get("carbon_monoxide")),
-            "no2": safe(hourly.get("nitrogen_dioxide")),
-            "o3": safe(hourly.get("ozone")),
-            "so2": safe(hourly.get("sulphur_dioxide")),
-            "time": safe(hourly.get("time"))
-        }
-        return jsonify(result)
+# ---- AQI forecast (local model) ----
+@app.route("/api/forecast", methods=["GET"])
+def api_forecast():
+    try:
+        lat = request.args.get("lat")
+        lon = request.args.get("lon")
+        if not lat or not lon:
+            return error_json("Missing coordinates", 400)
+        return jsonify(forecast_points([(float(lat), float(lon))])[0])
+    except FetchError as fe:
+        return error_json(str(fe), 503)
     except Exception as e:
         return error_json(str(e), 500)
 
+@app.route("/api/aqi/batch", methods=["POST"])
+def api_aqi_batch():
+    """
+    Body: { "points": [[lat, lon], ...] } (or [{"lat":.., "lon":..}, ...]).
+    Points are deduped onto cache cells; cells without a cached hourly series
+    are fetched with multi-coordinate Open-Meteo requests, chunks in parallel.
+    Columnar response:
+      { "cells": [...], "aqi": [...], "pm25": [...], ..., "index": [cell of each point] }
+    """
+    try:
+        body = request.get_json() or {}
+        raw_points = body.get("points") or []
+        settings = get_settings()
+        if not raw_points:
+            return error_json("Missing points", 400)
+        if len(raw_points) > settings.AQI_BATCH_MAX_POINTS:
+            return error_json(f"At most {settings.AQI_BATCH_MAX_POINTS} points per request", 400)
+
+        cells, cell_points, index = [], [], []
+        cell_pos = {}
+        for p in raw_points:
+            lat, lon = (p.get("lat"), p.get("lon")) if isinstance(p, dict) else p
+            lat, lon = float(lat), float(lon)
+            key = location_key(f"{lat},{lon}")
+            if key not in cell_pos:
+                cell_pos[key] = len(cells)
+                cells.append(key)
+                cell_points.append((lat, lon))
+            index.append(cell_pos[key])
+
+        values = [
+            _air_quality_fields(now) if now else None
+            for now in hourly_series.current_many("air_quality", cell_points)
+        ]
+
+        response = {"cells": [key.split(":", 1)[1] for key in cells]}
+        for field in AIR_QUALITY_FIELDS:
+            response[field] = [v.get(field) if v else None for v in values]
+        response["index"] = index
+        return jsonify(response)
+    except FetchError as fe:
+        return error_json(str(fe), 502)
+    except (TypeError, ValueError) as ve:
+        return error_json(f"Invalid points: {ve}", 400)
+    except Exception as e:
+        return error_json(str(e), 500)
+
+@app.route("/api/cache/stats", methods=["GET"])
+def api_cache_stats():
+    return jsonify({
+        "aqi": aqi_cache.stats(),
+        "analysis": analysis_cache.stats(),
+        "chat_sessions": chat_pool.stats(),
+        "hourly_series": hourly_series.series_cache.stats(),
+        "reverse_geocode": remote_cache.stats(),
+        "alerts": alert_engine.last_sweep,
+        "live_cells": live_cells.stats(),
+        "single_flight": flights.stats(),
+        "analysis_store": analysis_store.stats(),
+        "analysis_validation": structured.stats()
+    })
+
 # ---- AI advice (Gemini) ----
 @app.route("/api/ai/advice", methods=["POST"])
 def api_ai_advice():
@@ -462,7 +631,7 @@ Provide a brief advisory.
 
         gemini_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key={GEMINI_API_KEY}"
         payload = {"contents": [{"parts": [{"text": prompt}]}]}
-        resp = requests.post(gemini_url, json=payload, timeout=30)
+        resp = http_client.post(gemini_url, json=payload, provider="gemini")
         resp.raise_for_status()
         out = resp.json()
         advice = out.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text")
@@ -477,6 +646,11 @@ def not_found(e):
 
 # ---- Run ----
 if __name__ == "__main__":
+    if get_settings().PRECOMPUTE_ENABLED:
+        precompute_scheduler.start()
+    if get_settings().ALERTS_ENABLED:
+        alert_engine.start()
+    live_cells.start()
     socketio.run(
         app,
         host="0.0.0.0",
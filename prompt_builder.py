@@ -0,0 +1,138 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from config import get_settings
+
+settings = get_settings()
+# route exposure fields the analysis uses; sampling bookkeeping (coverage, calls) is dropped
+EXPOSURE_FIELDS = [
+    "avg_aqi", "max_aqi", "min_aqi", "exposure_score", "dose", "mean_pm25", "time_weighted_aqi",
+    "distance_km", "duration_min", "time_above_threshold_min", "threshold_aqi", "peak_segment",
+]
+WEATHER_FIELDS = ["temp", "humidity", "pm25", "pm10"]
+# trimmed in this order (least useful first) while the prompt is over budget
+OPTIONAL_FIELDS = [
+    ("route", "exposure", "peak_segment"),
+    ("route", "exposure", "threshold_aqi"),
+    ("route", "exposure", "min_aqi"),
+    ("route", "start"),
+    ("route", "end"),
+    ("weather", "pm10"),
+    ("weather", "pm25"),
+]
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for JSON-heavy English)."""
+    return (len(text) + 3) // 4
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+def _pick(d: Optional[Dict[str, Any]], fields: List[str]) -> Dict[str, Any]:
+    d = d or {}
+    return {k: d[k] for k in fields if d.get(k) is not None}
+
+def _round(v: Any, digits: int = 2) -> Any:
+    return round(v, digits) if isinstance(v, float) else v
+
+def project_inputs(comp_fetch: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The parts of a fetch_results() payload the model needs: one weather section
+    (without the raw Open-Meteo response), rounded numbers, no route id.
+    """
+    user = comp_fetch.get("user") or {}
+    current = comp_fetch.get("current") or {}
+    route = comp_fetch.get("route") or {}
+    weather = comp_fetch.get("weather") or current.get("current_weather") or {}
+    exposure = {k: _round(v) for k, v in _pick(route.get("exposure"), EXPOSURE_FIELDS).items()}
+    if isinstance(exposure.get("peak_segment"), dict):
+        exposure["peak_segment"] = {k: _round(v, 4) for k, v in exposure["peak_segment"].items()}
+    out = {
+        "user": _pick(user, ["age", "health_issues", "residence"]),
+        "current_aqi": current.get("current_aqi"),
+        "weather": {k: _round(v, 1) for k, v in _pick(weather, WEATHER_FIELDS).items()},
+        "route": {
+            "exposure": exposure,
+            "units": route.get("units"),
+        },
+    }
+    if route.get("start_lat") is not None:
+        out["route"]["start"] = [_round(route["start_lat"], 4), _round(route["start_lon"], 4)]
+    if route.get("end_lat") is not None:
+        out["route"]["end"] = [_round(route["end_lat"], 4), _round(route["end_lon"], 4)]
+    return out
+
+# JSON Schema keywords whose value is a map of name -> subschema, a subschema, or a list of subschemas
+_SCHEMA_MAPS = ("properties", "patternProperties", "definitions", "$defs", "dependencies")
+_SCHEMA_ONE = ("items", "additionalItems", "additionalProperties", "contains", "propertyNames",
+               "not", "if", "then", "else")
+_SCHEMA_LISTS = ("items", "allOf", "anyOf", "oneOf")
+_ANNOTATIONS = ("$schema", "title", "description")
+
+def strip_schema(schema: Any) -> Any:
+    """
+    Copy of a JSON schema without the annotations the model doesn't need
+    ($schema, title, description). Only keyword positions are stripped, so a
+    property that happens to be called "title" is kept.
+    """
+    if not isinstance(schema, dict):
+        return schema
+    out = {}
+    for key, value in schema.items():
+        if key in _ANNOTATIONS:
+            continue
+        if key in _SCHEMA_MAPS and isinstance(value, dict):
+            value = {name: strip_schema(sub) for name, sub in value.items()}
+        elif key in _SCHEMA_ONE and isinstance(value, dict):
+            value = strip_schema(value)
+        elif key in _SCHEMA_LISTS and isinstance(value, list):
+            value = [strip_schema(sub) for sub in value]
+        out[key] = value
+    return out
+
+def _drop(data: Dict[str, Any], path: Tuple[str, ...]) -> bool:
+    node = data
+    for key in path[:-1]:
+        node = node.get(key)
+        if not isinstance(node, dict):
+            return False
+    return node.pop(path[-1], None) is not None
+
+def build_analysis_prompt(comp_fetch: Dict[str, Any], schema: Optional[Dict[str, Any]] = None,
+                          budget: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Prompt for geminiForAnalysis from a projected, compact copy of the inputs.
+    The schema is only embedded when given (i.e. not passed as a response schema).
+    Optional fields are dropped (OPTIONAL_FIELDS order) until the estimate fits
+    `budget` tokens (ANALYSIS_PROMPT_TOKEN_BUDGET); returns (prompt, size stats).
+    """
+    budget = settings.ANALYSIS_PROMPT_TOKEN_BUDGET if budget is None else budget
+    data = project_inputs(comp_fetch)
+    schema_text = f"Schema:\n{_dumps(strip_schema(schema))}\n\n" if schema is not None else ""
+    dropped = []
+
+    def render() -> str:
+        return (
+            "You are an AQI analysis agent.\n"
+            "Based on the data (current AQI, weather, route exposure and user) provided, "
+            "analyse the situation carefully.\n"
+            "Respond ONLY with valid JSON matching the schema. "
+            "DO NOT write anything outside of the JSON object.\n\n"
+            f"{schema_text}"
+            f"Input:\n{_dumps(data)}\n"
+        )
+
+    prompt = render()
+    for path in OPTIONAL_FIELDS:
+        if estimate_tokens(prompt) <= budget:
+            break
+        if _drop(data, path):
+            dropped.append(".".join(path))
+            prompt = render()
+    stats = {
+        "chars": len(prompt),
+        "tokens_est": estimate_tokens(prompt),
+        "budget": budget,
+        "over_budget": estimate_tokens(prompt) > budget,
+        "dropped": dropped,
+    }
+    return prompt, stats
@@ -1,6 +1,7 @@
-import requests
+import http_client
 from config import get_settings
 from exceptions import FetchError
+from geo_cache import aqi_cache, location_key
 
 settings = get_settings()
 def _build_aqicn_url_for_location(location: str) -> str:
@@ -19,15 +20,23 @@ def _build_aqicn_url_for_location(location: str) -> str:
         # city name or station id
         return f"https://api.waqi.info/feed/{location}/?token={token}"
 
-def realtime_aqi(location: str) -> int:
+def realtime_aqi(location: str, use_cache: bool = True) -> int:
     """
     Returns integer AQI for the location.
     location: "CityName" or "lat,lon" (e.g., "22.5726,88.3639")
+    Coordinates are snapped to a geohash cell and served from the shared
+    aqi_cache while fresh; pass use_cache=False to force an upstream call.
     Raises FetchError on failure.
     """
+    if not use_cache:
+        return _fetch_realtime_aqi(location)
+    return aqi_cache.get_or_fetch("waqi", location_key(location), lambda: _fetch_realtime_aqi(location),
+                                  timeout=http_client.max_call_time("waqi"))
+
+def _fetch_realtime_aqi(location: str) -> int:
     url = _build_aqicn_url_for_location(location)
     try:
-        resp = requests.get(url, timeout=settings.REQUEST_TIMEOUT)
+        resp = http_client.get(url, provider="waqi")
         resp.raise_for_status()
         j = resp.json()
     except Exception as e:
@@ -0,0 +1,150 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import db
+from advisor import create_aqi_chat_agent, user_chat
+from analyzer import refresh_analysis
+from config import get_settings
+from schedule_windows import in_window, parse_windows
+
+settings = get_settings()
+ONELINER_PROMPT = 'Based off all the details give me detailed advice for today in one single sentence, without any formatting'
+
+def compute_route_exposure(user_id: str) -> Dict[str, Any]:
+    """
+    Full route-exposure pipeline for one user:
+    analysis (fetch_results -> Gemini) -> chat agent -> one-line advice.
+    """
+    record = refresh_analysis(user_id=user_id)
+    chat = create_aqi_chat_agent(record.analysis)
+    oneliner = user_chat(chat, ONELINER_PROMPT)
+    return {
+        "riskLevel": "High",
+        "distanceFactor": 0.85,
+        "advice": oneliner
+    }
+
+class RecommendationStore:
+    """In-memory latest route-exposure result per user."""
+    def __init__(self):
+        self._results: Dict[str, Tuple[float, datetime, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, user_id: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._results[user_id] = (time.monotonic(), datetime.now(), result)
+
+    def get(self, user_id: str) -> Optional[Tuple[Dict[str, Any], float, datetime]]:
+        """Returns (result, age_seconds, computed_at) or None."""
+        with self._lock:
+            item = self._results.get(user_id)
+        if item is None:
+            return None
+        stored, computed_at, result = item
+        return result, time.monotonic() - stored, computed_at
+
+class PrecomputeScheduler:
+    """
+    Background thread that refreshes route-exposure results ahead of time for
+    users with commute_alerts / morning_summary enabled, during (and shortly
+    before) their commute / morning windows. Other periodic warm-ups (e.g. the
+    AQI forecast cache) can be registered with add_job() and share its pool.
+    """
+    def __init__(self, store: RecommendationStore):
+        self.store = store
+        self.interval = settings.PRECOMPUTE_INTERVAL
+        self.max_age = settings.PRECOMPUTE_MAX_AGE
+        self.commute_windows = parse_windows(settings.COMMUTE_WINDOWS)
+        self.morning_windows = parse_windows(settings.MORNING_SUMMARY_WINDOW)
+        self._pool = ThreadPoolExecutor(max_workers=settings.PRECOMPUTE_WORKERS)
+        self._in_flight = set()
+        self._jobs: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self, user_id: str) -> bool:
+        """Queues a background refresh; returns False if one is already running."""
+        with self._lock:
+            if user_id in self._in_flight:
+                return False
+            self._in_flight.add(user_id)
+        self._pool.submit(self._run, user_id)
+        return True
+
+    def _run(self, user_id: str) -> None:
+        try:
+            self.store.put(user_id, compute_route_exposure(user_id))
+        except Exception as e:
+            print(f"Precompute failed for {user_id}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(user_id)
+
+    def add_job(self, name: str, fn: Callable[[], Any], interval: float) -> None:
+        """Runs `fn` in the pool every `interval` seconds (checked once per sweep)."""
+        with self._lock:
+            self._jobs[name] = [fn, interval, 0.0]
+
+    def _run_job(self, name: str, fn: Callable[[], Any]) -> None:
+        try:
+            fn()
+        except Exception as e:
+            print(f"Precompute job {name} failed: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(("job", name))
+
+    def _run_due_jobs(self) -> int:
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for name, job in self._jobs.items():
+                fn, interval, next_run = job
+                if now >= next_run and ("job", name) not in self._in_flight:
+                    job[2] = now + interval
+                    self._in_flight.add(("job", name))
+                    due.append((name, fn))
+        for name, fn in due:
+            self._pool.submit(self._run_job, name, fn)
+        return len(due)
+
+    def _due_users(self, now: datetime) -> List[str]:
+        due = []
+        for username, morning_summary, commute_alerts in db.listScheduledUsers():
+            active = (commute_alerts and in_window(now, self.commute_windows, settings.PRECOMPUTE_LEAD_MINUTES)) or \
+                     (morning_summary and in_window(now, self.morning_windows, settings.PRECOMPUTE_LEAD_MINUTES))
+            if not active:
+                continue
+            latest = self.store.get(username)
+            if latest is None or latest[1] > self.max_age:
+                due.append(username)
+        return due
+
+    def sweep(self) -> int:
+        due = self._due_users(datetime.now())
+        for user_id in due:
+            self.refresh(user_id)
+        return len(due)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._run_due_jobs()
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Precompute sweep failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="precompute", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+store = RecommendationStore()
+scheduler = PrecomputeScheduler(store)
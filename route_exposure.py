@@ -1,31 +1,102 @@
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Optional, Tuple
 from realtime_aqi import realtime_aqi
+from exposure_engine import integrate_exposure
+from route_sampler import adaptive_sample
+from config import get_settings
 from exceptions import FetchError
 
-def calculate_exposure(route_points: List[Dict[str, float]]) -> Dict[str, float]:
+settings = get_settings()
+
+def _sample_point(lat: float, lon: float) -> int:
+    return int(realtime_aqi(f"{lat},{lon}"))
+
+def _sample_batch(coords: List[Tuple[float, float]], timeout: float,
+                  max_in_flight: int) -> List[Optional[int]]:
+    """
+    Fetches AQI for every coordinate concurrently, waiting at most `timeout` seconds.
+    Returns one value per coordinate, None where the lookup failed or didn't finish.
+    """
+    if not coords:
+        return []
+    pool = ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(coords))))
+    try:
+        futures = [pool.submit(_sample_point, lat, lon) for lat, lon in coords]
+        done, _ = wait(futures, timeout=timeout)
+    finally:
+        # don't block on stragglers past the deadline, and drop queued ones
+        pool.shutdown(wait=False, cancel_futures=True)
+    values = []
+    for fut in futures:
+        try:
+            values.append(fut.result() if fut in done else None)
+        except Exception:
+            # skip points we can't fetch
+            values.append(None)
+    return values
+
+def calculate_exposure(route_points: List[Dict[str, float]],
+                       max_in_flight: Optional[int] = None,
+                       deadline: Optional[float] = None,
+                       mode: Optional[str] = None,
+                       speed_kmh: Optional[float] = None,
+                       adaptive: Optional[bool] = None) -> Dict[str, float]:
     """
     route_points: [{'lat': 22.5, 'lon': 88.3}, ...] OR [{'lat':.., 'lng':..}]
+    max_in_flight: max concurrent AQI lookups (defaults to ROUTE_MAX_IN_FLIGHT, 1 = sequential)
+    deadline: overall seconds to wait for samples (defaults to ROUTE_DEADLINE);
+              points still pending after it are dropped from the statistics
+    mode / speed_kmh: travel mode (see exposure_engine.TRAVEL_SPEEDS_KMH) or explicit speed,
+              used to integrate the dose along the route
+    adaptive: sample the corridor adaptively (route_sampler) instead of every point;
+              defaults to True for routes longer than ROUTE_ADAPTIVE_MIN_POINTS
     Returns:
       {
         "avg_aqi": float,
         "max_aqi": int,
         "min_aqi": int,
-        "exposure_score": float  # normalized 0-100 (simple scaling)
+        "exposure_score": float,  # normalized 0-100 (simple scaling)
+        "sampled_points": int,
+        "total_points": int,
+        "coverage": float,        # sampled_points / points requested (failed and skipped count against it)
+        "skipped_points": int,    # adaptive sampling: requested but dropped when the deadline passed
+        "upstream_calls": int,
+        "calls_saved": int,
+        ...                       # plus the integrate_exposure() fields (dose, peak_segment, ...)
       }
     """
-    aqi_values = []
+    if max_in_flight is None:
+        max_in_flight = settings.ROUTE_MAX_IN_FLIGHT
+    if deadline is None:
+        deadline = settings.ROUTE_DEADLINE
+
+    coords = []
     for p in route_points:
         lat = p.get("lat")
-        lon = p.get("lon") 
+        lon = p.get("lon")
         if lat is None or lon is None:
             continue
-        loc = f"{lat},{lon}"
-        try:
-            aqi = realtime_aqi(loc)
-            aqi_values.append(int(aqi))
-        except Exception:
-            # skip points we can't fetch
-            continue
+        coords.append((lat, lon))
+    if adaptive is None:
+        adaptive = len(coords) > settings.ROUTE_ADAPTIVE_MIN_POINTS
+
+    if adaptive:
+        result = adaptive_sample(
+            [c[0] for c in coords], [c[1] for c in coords],
+            lambda batch, timeout: _sample_batch(batch, timeout, max_in_flight),
+            deadline=deadline
+        )
+        sampled = [(s["lat"], s["lon"]) for s in result["samples"]]
+        aqi_values = [s["aqi"] for s in result["samples"]]
+        calls = result["upstream_calls"]
+        requested = result["requested_points"]
+        skipped = result["skipped_points"]
+    else:
+        values = _sample_batch(coords, deadline, max_in_flight)
+        sampled = [c for c, v in zip(coords, values) if v is not None]
+        aqi_values = [v for v in values if v is not None]
+        calls = requested = len(coords)
+        skipped = 0
 
     if len(aqi_values) == 0:
         raise FetchError("No AQI data available for any route points")
@@ -36,9 +107,22 @@ def calculate_exposure(route_points: List[Dict[str, float]]) -> Dict[str, float]
 
     # simple exposure score: map avg aqi to 0-100 (0..50 => low, 50..100 moderate..)
     exposure_score = min(100.0, max(0.0, (avg / 500.0) * 100.0))
+    dose = integrate_exposure(
+        [c[0] for c in coords], [c[1] for c in coords],
+        [c[0] for c in sampled], [c[1] for c in sampled], aqi_values,
+        mode=mode or settings.ROUTE_TRAVEL_MODE, speed_kmh=speed_kmh,
+        threshold_aqi=settings.EXPOSURE_THRESHOLD_AQI
+    )
     return {
         "avg_aqi": avg,
         "max_aqi": mx,
         "min_aqi": mn,
-        "exposure_score": exposure_score
-    }
\ No newline at end of file
+        "exposure_score": exposure_score,
+        "sampled_points": len(aqi_values),
+        "total_points": len(coords),
+        "coverage": len(aqi_values) / requested,
+        "skipped_points": skipped,
+        "upstream_calls": calls,
+        "calls_saved": len(coords) - calls,
+        **dose
+    }
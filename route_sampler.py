@@ -0,0 +1,128 @@
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from config import get_settings
+from exposure_engine import haversine_m
+
+settings = get_settings()
+# fetch_batch(coords, timeout) -> one AQI (or None on failure) per coordinate
+FetchBatch = Callable[[List[Tuple[float, float]], float], List[Optional[int]]]
+
+def geohash_cell_ids(lats, lons, precision: int) -> np.ndarray:
+    """
+    Vectorized geohash cell id: the same partition as geo_cache.geohash() at
+    `precision`, packed into one int64 per point instead of a base32 string.
+    """
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    lat_bin = np.floor((np.asarray(lats, dtype=float) + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64)
+    lon_bin = np.floor((np.asarray(lons, dtype=float) + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64)
+    lat_bin = np.clip(lat_bin, 0, (1 << lat_bits) - 1)
+    lon_bin = np.clip(lon_bin, 0, (1 << lon_bits) - 1)
+    return (lat_bin << lon_bits) | lon_bin
+
+def adaptive_sample(lats: Sequence[float], lons: Sequence[float], fetch_batch: FetchBatch,
+                    tolerance: Optional[float] = None,
+                    min_spacing_m: Optional[float] = None,
+                    initial_spacing_m: Optional[float] = None,
+                    deadline: Optional[float] = None,
+                    precision: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Picks AQI sample points along a polyline with as few upstream calls as possible.
+
+    Starts from a coarse stride (initial_spacing_m, always including both ends),
+    then bisects every pair of neighbouring samples whose readings differ by more
+    than `tolerance` AQI while they are further than `min_spacing_m` apart.
+    Vertices falling in an already sampled station cell (geohash at `precision`)
+    reuse that reading instead of calling upstream. Each bisection round is one
+    concurrent fetch_batch call; rounds stop at `deadline` seconds.
+
+    Returns:
+      {
+        "samples": [{"index", "lat", "lon", "aqi"}],   # ordered along the route
+        "requested_points": int,  # vertices picked for sampling
+        "skipped_points": int,    # picked but never fetched (deadline passed)
+        "upstream_calls": int,
+        "failed_calls": int,
+        "vertices": int,
+        "calls_saved": int        # vs. one call per vertex
+      }
+    """
+    tolerance = settings.ROUTE_SAMPLE_TOLERANCE if tolerance is None else tolerance
+    min_spacing_m = settings.ROUTE_SAMPLE_MIN_SPACING_M if min_spacing_m is None else min_spacing_m
+    initial_spacing_m = settings.ROUTE_SAMPLE_INITIAL_SPACING_M if initial_spacing_m is None else initial_spacing_m
+    deadline = settings.ROUTE_DEADLINE if deadline is None else deadline
+    precision = settings.GEO_CACHE_PRECISION if precision is None else precision
+
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    n = lats.size
+    if n == 0:
+        return {"samples": [], "requested_points": 0, "skipped_points": 0, "upstream_calls": 0,
+                "failed_calls": 0, "vertices": 0, "calls_saved": 0}
+    cum_m = np.concatenate(([0.0], np.cumsum(haversine_m(lats[:-1], lons[:-1], lats[1:], lons[1:]))))
+    cells = geohash_cell_ids(lats, lons, precision)
+
+    cell_aqi: Dict[int, Optional[int]] = {}
+    sampled = set()
+    calls = 0
+    failed = 0
+    ends_at = time.monotonic() + deadline
+
+    def sample(indices) -> None:
+        nonlocal calls, failed
+        todo: Dict[int, int] = {}
+        for i in indices:
+            sampled.add(int(i))
+            c = int(cells[i])
+            if c not in cell_aqi and c not in todo:
+                todo[c] = int(i)
+        if not todo:
+            return
+        remaining = ends_at - time.monotonic()
+        if remaining <= 0:
+            return
+        idx = list(todo.values())
+        values = fetch_batch([(float(lats[i]), float(lons[i])) for i in idx], remaining)
+        calls += len(idx)
+        for c, v in zip(todo.keys(), values):
+            cell_aqi[c] = v
+            if v is None:
+                failed += 1
+
+    stride = np.arange(0.0, cum_m[-1], max(initial_spacing_m, 1.0))
+    sample(np.unique(np.concatenate((np.searchsorted(cum_m, stride), [n - 1]))))
+
+    while time.monotonic() < ends_at:
+        order = sorted(sampled)
+        new = []
+        for i, j in zip(order[:-1], order[1:]):
+            if j - i < 2 or cum_m[j] - cum_m[i] <= min_spacing_m:
+                continue
+            a, b = cell_aqi.get(int(cells[i])), cell_aqi.get(int(cells[j]))
+            if a is None or b is None or abs(a - b) <= tolerance:
+                continue
+            mid = int(np.searchsorted(cum_m, (cum_m[i] + cum_m[j]) / 2))
+            new.append(min(max(mid, i + 1), j - 1))
+        if not new:
+            break
+        sample(new)
+
+    samples = []
+    skipped = 0
+    for i in sorted(sampled):
+        c = int(cells[i])
+        if c not in cell_aqi:
+            skipped += 1
+        elif cell_aqi[c] is not None:
+            samples.append({"index": i, "lat": float(lats[i]), "lon": float(lons[i]), "aqi": cell_aqi[c]})
+    return {
+        "samples": samples,
+        "requested_points": len(sampled),
+        "skipped_points": skipped,
+        "upstream_calls": calls,
+        "failed_calls": failed,
+        "vertices": n,
+        "calls_saved": n - calls
+    }
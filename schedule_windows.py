@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import List, Tuple
+
+def parse_windows(spec: str) -> List[Tuple[int, int]]:
+    """ "07:00-10:00,17:00-20:00" -> [(420, 600), (1020, 1200)] in minutes of day """
+    windows = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, end = part.split("-")
+        sh, sm = [int(x) for x in start.split(":")]
+        eh, em = [int(x) for x in end.split(":")]
+        windows.append((sh * 60 + sm, eh * 60 + em))
+    return windows
+
+def in_window(now: datetime, windows: List[Tuple[int, int]], lead_minutes: int = 0) -> bool:
+    minute = now.hour * 60 + now.minute
+    for start, end in windows:
+        # open `lead_minutes` early so the result is warm when the window starts
+        if (minute - (start - lead_minutes)) % 1440 <= (end - start + lead_minutes) % 1440:
+            return True
+    return False
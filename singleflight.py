@@ -0,0 +1,114 @@
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from config import get_settings
+from exceptions import FlightTimeoutError
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """The leader's result (or exception); raises FlightTimeoutError if it takes longer than `timeout`."""
+        if not self.done.wait(timeout):
+            raise FlightTimeoutError(f"Shared upstream call did not finish within {timeout:.0f}s")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller (the leader)
+    runs the fetch, everyone arriving while it is in flight waits and gets the
+    same result or exception. Nothing is cached once the call has finished.
+    Keys are (namespace, key) so metrics can be reported per namespace.
+
+    Waiters give up after a timeout (the caller's bound on the fetch, else
+    `default_timeout`) and the stuck call is detached, so a hung leader can't
+    block later callers: the next one starts a fresh fetch.
+    """
+    def __init__(self, default_timeout: float):
+        self.default_timeout = default_timeout
+        self._calls: Dict[Tuple[str, Hashable], _Call] = {}
+        self._lock = threading.Lock()
+        self._executed: Dict[str, int] = defaultdict(int)
+        self._coalesced: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._timeouts: Dict[str, int] = defaultdict(int)
+
+    def begin(self, namespace: str, key: Hashable) -> Tuple[bool, _Call]:
+        """
+        Claims `key`: returns (True, call) if the caller must run the fetch and
+        then finish() it, or (False, call) to wait on another caller's fetch.
+        """
+        with self._lock:
+            call = self._calls.get((namespace, key))
+            if call is not None:
+                call.waiters += 1
+                self._coalesced[namespace] += 1
+                return False, call
+            call = self._calls[(namespace, key)] = _Call()
+            self._executed[namespace] += 1
+            return True, call
+
+    def finish(self, namespace: str, key: Hashable, call: _Call, result: Any = None,
+               error: BaseException = None) -> None:
+        with self._lock:
+            if self._calls.get((namespace, key)) is call:
+                del self._calls[(namespace, key)]
+            if error is not None:
+                self._errors[namespace] += 1
+        call.result = result
+        call.error = error
+        call.done.set()
+
+    def wait(self, namespace: str, key: Hashable, call: _Call, timeout: Optional[float] = None) -> Any:
+        """Follower side of begin(): waits for the leader at most `timeout` seconds."""
+        try:
+            return call.wait(self.default_timeout if timeout is None else timeout)
+        except FlightTimeoutError:
+            with self._lock:
+                self._timeouts[namespace] += 1
+                if self._calls.get((namespace, key)) is call:
+                    del self._calls[(namespace, key)]
+            raise
+
+    def do(self, namespace: str, key: Hashable, fetch: Callable[[], Any],
+           timeout: Optional[float] = None) -> Any:
+        """
+        Runs or joins the fetch for `key`. `timeout` bounds how long a follower
+        waits (derive it from the provider's timeout); defaults to default_timeout.
+        """
+        leader, call = self.begin(namespace, key)
+        if not leader:
+            return self.wait(namespace, key, call, timeout)
+        try:
+            result = fetch()
+        except BaseException as e:
+            self.finish(namespace, key, call, error=e)
+            raise
+        self.finish(namespace, key, call, result=result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for ns in set(self._executed) | set(self._coalesced):
+                executed, coalesced = self._executed[ns], self._coalesced[ns]
+                out[ns] = {
+                    "executed": executed,
+                    "coalesced": coalesced,
+                    "errors": self._errors[ns],
+                    "timeouts": self._timeouts[ns],
+                    "coalesce_rate": coalesced / (executed + coalesced) if executed + coalesced else 0.0
+                }
+            out["in_flight"] = len(self._calls)
+            return out
+
+# ---------- shared instance used by the provider wrappers
+flights = SingleFlight(default_timeout=get_settings().SINGLE_FLIGHT_TIMEOUT)
@@ -0,0 +1,132 @@
+import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import jsonschema
+from exceptions import InvalidOutputError
+
+def _types(schema: Dict[str, Any]) -> List[str]:
+    t = schema.get("type")
+    return t if isinstance(t, list) else [t] if t else []
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip().rstrip("%"))
+        except ValueError:
+            return None
+    return None
+
+def coerce(value: Any, schema: Dict[str, Any]) -> Any:
+    """
+    Cheap local repair towards `schema`: numeric strings / integral floats to
+    the declared number type, numbers to strings, clamping to minimum/maximum,
+    a lone object wrapped into an array, and null for missing nullable
+    required fields. Anything it can't fix is returned unchanged.
+    """
+    types = _types(schema)
+    if value is None:
+        return value
+    if "object" in types and isinstance(value, dict):
+        props = schema.get("properties") or {}
+        out = {k: coerce(v, props[k]) if k in props else v for k, v in value.items()}
+        for name in schema.get("required") or []:
+            if name not in out and "null" in _types(props.get(name) or {}):
+                out[name] = None
+        return out
+    if "array" in types:
+        if isinstance(value, dict):
+            value = [value]
+        if isinstance(value, list) and isinstance(schema.get("items"), dict):
+            return [coerce(v, schema["items"]) for v in value]
+        return value
+    if ("integer" in types or "number" in types) and not isinstance(value, bool):
+        num = _number(value)
+        if num is not None:
+            if "number" not in types:
+                value = int(round(num))
+            elif not isinstance(value, (int, float)):
+                value = num
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            value = type(value)(schema["minimum"])
+        if "maximum" in schema and value > schema["maximum"]:
+            value = type(value)(schema["maximum"])
+        if "string" in types and "number" not in types and "integer" not in types:
+            value = str(value)
+    return value
+
+class StructuredOutput:
+    """
+    Validates model JSON against a schema with a validator compiled once, and
+    repairs invalid output in bounded steps: local coercion first, then at most
+    one re-ask with the validation errors (the caller supplies `reask`).
+    Counts how often each step was needed.
+    """
+    def __init__(self, schema: Dict[str, Any], max_reasks: int = 1):
+        jsonschema.Draft7Validator.check_schema(schema)
+        self.schema = schema
+        self.validator = jsonschema.Draft7Validator(schema)
+        self.max_reasks = max_reasks
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "valid_first_pass": 0, "repaired_locally": 0,
+                        "reasks": 0, "repaired_by_reask": 0, "failed": 0, "invalid_json": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def errors(self, value: Any) -> List[str]:
+        return [
+            f"{'/'.join(str(p) for p in e.absolute_path) or '(root)'}: {e.message}"
+            for e in self.validator.iter_errors(value)
+        ]
+
+    def _parse(self, text: str) -> Tuple[Any, List[str]]:
+        try:
+            return json.loads(text), []
+        except (TypeError, ValueError) as e:
+            self._count("invalid_json")
+            return None, [f"(root): response is not valid JSON ({e})"]
+
+    def parse(self, text: str, reask=None) -> Dict[str, Any]:
+        """
+        Parsed, schema-valid object from `text`. `reask(previous_text, errors)`
+        returns the model's corrected text. Raises InvalidOutputError if still invalid.
+        """
+        self._count("calls")
+        value, errs = self._parse(text)
+        if not errs:
+            errs = self.errors(value)
+            if not errs:
+                self._count("valid_first_pass")
+                return value
+            value = coerce(value, self.schema)
+            errs = self.errors(value)
+            if not errs:
+                self._count("repaired_locally")
+                return value
+        for _ in range(self.max_reasks if reask is not None else 0):
+            self._count("reasks")
+            text = reask(text, errs)
+            value, errs = self._parse(text)
+            if not errs:
+                value = coerce(value, self.schema)
+                errs = self.errors(value)
+            if not errs:
+                self._count("repaired_by_reask")
+                return value
+        self._count("failed")
+        raise InvalidOutputError("Model output failed schema validation: " + "; ".join(errs[:5]))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            c = dict(self._counts)
+        calls = c["calls"]
+        c["validation_failure_rate"] = (calls - c["valid_first_pass"]) / calls if calls else 0.0
+        c["reask_rate"] = c["reasks"] / calls if calls else 0.0
+        c["failure_rate"] = c["failed"] / calls if calls else 0.0
+        return c
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+# keep on-disk caches out of the working tree and don't require real API keys
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="airware-test-"))
+os.environ.setdefault("GEMINI_API_KEY", "test")
@@ -0,0 +1,75 @@
+import calendar
+import sqlite3
+import time
+import pytest
+from history_store import HistoryStore
+
+def _row(month, avg=40.0):
+    return {"month": month, "avg": avg, "min": 10.0, "max": 90.0, "count": 30}
+
+def _month(offset_months):
+    now = time.gmtime()
+    total = now.tm_year * 12 + (now.tm_mon - 1) + offset_months
+    return f"{total // 12:04d}-{total % 12 + 1:02d}"
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(tmp_path / "h.sqlite3", max_bytes=64 * 1024 * 1024, retention_months=60,
+                        empty_recheck_days=45, empty_ttl=3600)
+
+def test_month_closed_at():
+    assert HistoryStore.month_closed_at("2024-01") == calendar.timegm((2024, 2, 1, 0, 0, 0))
+    assert HistoryStore.month_closed_at("2024-12") == calendar.timegm((2025, 1, 1, 0, 0, 0))
+
+def test_get_months_returns_stored_rows_and_empties(store):
+    store.put_months(7, [_row("2020-01")], empty_months=["2020-02"])
+    got = store.get_months(7, ["2020-01", "2020-02", "2020-03"])
+    assert got["2020-01"]["avg"] == 40.0
+    assert got["2020-02"] is None
+    assert "2020-03" not in got
+    assert store.get_months(8, ["2020-01"]) == {}
+
+def test_old_empty_month_is_final(store):
+    store.put_months(7, [], empty_months=["2020-02"])
+    with store._lock:
+        store._conn.execute("UPDATE monthly SET fetched_at=0")
+    assert store.get_months(7, ["2020-02"]) == {"2020-02": None}
+
+def test_recent_empty_month_is_rechecked_after_ttl(store):
+    last = _month(-1)
+    store.put_months(7, [], empty_months=[last])
+    assert store.get_months(7, [last]) == {last: None}
+    with store._lock:
+        store._conn.execute("UPDATE monthly SET fetched_at=fetched_at-7200")
+    assert store.get_months(7, [last]) == {}
+    # a later fetch that finds data replaces the empty row
+    store.put_months(7, [_row(last, 55.0)])
+    assert store.get_months(7, [last])[last]["avg"] == 55.0
+
+def test_adds_fetched_at_to_existing_files(tmp_path):
+    path = tmp_path / "old.sqlite3"
+    conn = sqlite3.connect(str(path))
+    conn.execute("""CREATE TABLE monthly (sensor_id INTEGER NOT NULL, month TEXT NOT NULL, avg REAL,
+                    min REAL, max REAL, count INTEGER NOT NULL DEFAULT 0, last_access REAL NOT NULL,
+                    PRIMARY KEY (sensor_id, month)) WITHOUT ROWID""")
+    conn.execute("INSERT INTO monthly VALUES (1, '2020-01', NULL, NULL, NULL, 0, 0)")
+    conn.commit()
+    conn.close()
+    store = HistoryStore(path, max_bytes=1 << 30, retention_months=1200, empty_recheck_days=45, empty_ttl=3600)
+    assert store.get_months(1, ["2020-01"]) == {"2020-01": None}
+
+def test_compact_drops_expired_and_evicts_least_recent(tmp_path):
+    store = HistoryStore(tmp_path / "c.sqlite3", max_bytes=1 << 30, retention_months=12)
+    store.put_months(1, [_row("2000-01"), _row(_month(-2))])
+    result = store.compact()
+    assert result["expired"] == 1
+    assert store.get_months(1, ["2000-01"]) == {}
+
+    for sid in range(40):
+        store.put_months(sid, [_row(_month(-m)) for m in range(1, 12)])
+    store.get_months(39, [_month(-1)])
+    store.max_bytes = store.size_bytes() // 2
+    result = store.compact()
+    assert result["evicted"] > 0
+    assert result["size_bytes"] <= store.max_bytes
+    assert store.get_months(39, [_month(-1)])
@@ -0,0 +1,97 @@
+import pytest
+import requests
+import http_client
+from exceptions import CircuitOpenError
+from http_client import CircuitBreaker
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+@pytest.fixture
+def breaker(monkeypatch):
+    b = CircuitBreaker("test", threshold=10, reset_timeout=30)
+    monkeypatch.setitem(http_client._breakers, http_client.DEFAULT_PROVIDER, b)
+    monkeypatch.setattr(http_client.time, "sleep", lambda s: None)
+    return b
+
+def _session(monkeypatch, outcomes):
+    calls = []
+    def request(method, url, timeout=None, **kwargs):
+        calls.append(url)
+        out = outcomes.pop(0)
+        if isinstance(out, Exception):
+            raise out
+        return FakeResponse(out)
+    monkeypatch.setattr(http_client._session, "request", request)
+    return calls
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    b = CircuitBreaker("p", threshold=2, reset_timeout=30)
+    b.record_failure()
+    assert b.state() == "closed"
+    b.record_failure()
+    assert b.state() == "open"
+    with pytest.raises(CircuitOpenError):
+        b.before_call()
+
+def test_breaker_half_open_allows_single_trial(monkeypatch):
+    b = CircuitBreaker("p", threshold=1, reset_timeout=30)
+    b.record_failure()
+    b.opened_at -= 31
+    assert b.state() == "half_open"
+    b.before_call()
+    with pytest.raises(CircuitOpenError):
+        b.before_call()
+    b.record_success()
+    assert b.state() == "closed"
+    b.before_call()
+
+def test_failed_trial_reopens():
+    b = CircuitBreaker("p", threshold=5, reset_timeout=30)
+    for _ in range(5):
+        b.record_failure()
+    b.opened_at -= 31
+    b.before_call()
+    b.record_failure()
+    assert b.state() == "open"
+    assert not b._trial_in_flight
+
+def test_retries_connection_errors_then_succeeds(monkeypatch, breaker):
+    calls = _session(monkeypatch, [requests.ConnectionError(), 200])
+    resp = http_client.get("http://example.invalid/x")
+    assert resp.status_code == 200
+    assert len(calls) == 2
+    assert breaker.failures == 0
+
+def test_retry_status_returned_after_retries(monkeypatch, breaker):
+    calls = _session(monkeypatch, [503, 503, 503])
+    resp = http_client.get("http://example.invalid/x")
+    assert resp.status_code == 503
+    assert len(calls) == http_client.settings.HTTP_MAX_RETRIES + 1
+
+def test_post_is_not_retried(monkeypatch, breaker):
+    calls = _session(monkeypatch, [requests.ConnectionError(), 200])
+    with pytest.raises(requests.ConnectionError):
+        http_client.post("http://example.invalid/x", json={})
+    assert len(calls) == 1
+
+def test_non_retryable_error_is_recorded_and_not_retried(monkeypatch, breaker):
+    calls = _session(monkeypatch, [requests.TooManyRedirects()])
+    with pytest.raises(requests.TooManyRedirects):
+        http_client.get("http://example.invalid/x")
+    assert len(calls) == 1
+    assert breaker.failures == 1
+
+def test_non_retryable_error_during_trial_releases_breaker(monkeypatch, breaker):
+    breaker.failures = breaker.threshold
+    breaker.opened_at = http_client.time.monotonic() - 31
+    _session(monkeypatch, [requests.exceptions.InvalidURL()])
+    with pytest.raises(requests.exceptions.InvalidURL):
+        http_client.get("http://example.invalid/x")
+    assert breaker.state() == "open"
+    breaker.opened_at -= 31
+    # a later trial is let through again instead of being rejected forever
+    _session(monkeypatch, [200])
+    assert http_client.get("http://example.invalid/x").status_code == 200
+    assert breaker.state() == "closed"
@@ -0,0 +1,107 @@
+import threading
+import time
+import pytest
+from exceptions import FlightTimeoutError
+from geo_cache import GeoTTLCache, geohash, location_key
+from singleflight import SingleFlight
+
+def _run_concurrently(n, fn):
+    results, errors = [None] * n, [None] * n
+    start = threading.Barrier(n)
+
+    def worker(i):
+        start.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            errors[i] = e
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results, errors
+
+def test_concurrent_callers_share_one_fetch():
+    flights = SingleFlight(default_timeout=5)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.1)
+        return 42
+    results, errors = _run_concurrently(10, lambda: flights.do("ns", "k", fetch))
+    assert results == [42] * 10
+    assert errors == [None] * 10
+    assert len(calls) == 1
+    stats = flights.stats()
+    assert stats["ns"]["executed"] == 1
+    assert stats["ns"]["coalesced"] == 9
+    assert stats["in_flight"] == 0
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    flights = SingleFlight(default_timeout=5)
+
+    def fetch():
+        time.sleep(0.1)
+        raise ValueError("boom")
+    _, errors = _run_concurrently(5, lambda: flights.do("ns", "k", fetch))
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert flights.do("ns", "k", lambda: "fresh") == "fresh"
+
+def test_different_keys_and_namespaces_do_not_coalesce():
+    flights = SingleFlight(default_timeout=5)
+    assert flights.do("a", "k", lambda: 1) == 1
+    assert flights.do("b", "k", lambda: 2) == 2
+    assert flights.do("a", "j", lambda: 3) == 3
+
+def test_waiter_times_out_on_hung_leader_and_call_is_detached():
+    flights = SingleFlight(default_timeout=5)
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flights.do("ns", "k", lambda: release.wait(5)))
+    leader.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    with pytest.raises(FlightTimeoutError):
+        flights.do("ns", "k", lambda: "unused", timeout=0.1)
+    assert time.monotonic() - started < 1
+    # the next caller starts its own fetch instead of joining the stuck one
+    assert flights.do("ns", "k", lambda: "fresh", timeout=0.1) == "fresh"
+    assert flights.stats()["ns"]["timeouts"] == 1
+    release.set()
+    leader.join(5)
+
+def test_caches_sharing_a_namespace_fetch_independently():
+    a = GeoTTLCache(ttl=60, max_entries=10)
+    b = GeoTTLCache(ttl=60, max_entries=10)
+    gate = threading.Event()
+
+    def slow():
+        gate.wait(2)
+        return "a"
+    out = {}
+    t = threading.Thread(target=lambda: out.setdefault("a", a.get_or_fetch("ns", "cell", slow)))
+    t.start()
+    time.sleep(0.05)
+    # a's fetch is still in flight; b must not join it
+    out["b"] = b.get_or_fetch("ns", "cell", lambda: "b")
+    gate.set()
+    t.join(5)
+    assert out == {"a": "a", "b": "b"}
+
+def test_get_or_fetch_caches_and_peek_does_not_count():
+    cache = GeoTTLCache(ttl=60, max_entries=10)
+    calls = []
+    assert cache.get_or_fetch("ns", "c", lambda: calls.append(1) or "v") == "v"
+    assert cache.get_or_fetch("ns", "c", lambda: calls.append(1) or "w") == "v"
+    assert len(calls) == 1
+    hits, misses = cache.hits, cache.misses
+    assert cache.peek("ns", "c") == (True, "v")
+    assert cache.peek("ns", "missing") == (False, None)
+    assert (cache.hits, cache.misses) == (hits, misses)
+
+def test_location_key_snaps_coordinates_to_geohash_cells():
+    assert geohash(57.64911, 10.40744, 6) == "u4pruy"
+    assert location_key("22.5726,88.3639", precision=6) == location_key("22.5727, 88.3640", precision=6)
+    assert location_key("22.5726,88.3639").startswith("gh:")
+    assert location_key("  New   Delhi ") == "name:new delhi"
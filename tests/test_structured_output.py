@@ -0,0 +1,87 @@
+import json
+from pathlib import Path
+import pytest
+from exceptions import InvalidOutputError
+from structured_output import StructuredOutput, coerce
+
+SCHEMA = json.loads((Path(__file__).resolve().parent.parent / "analysis_schema.json").read_text())
+
+def _valid():
+    return {
+        "location": "Test",
+        "current_aqi": 42,
+        "current_category": "Good",
+        "exposure_summary": {"total_exposure": 1.5, "today_exposure": 0.5, "units": "AQI-hours"},
+        "risk_score": 0.2,
+        "recommendations": [{"type": "commute", "severity": "low", "message": "ok"}],
+    }
+
+def test_coerce_numbers_and_clamping():
+    out = coerce({"current_aqi": "42", "risk_score": 1.5}, SCHEMA)
+    assert out["current_aqi"] == 42 and isinstance(out["current_aqi"], int)
+    assert out["risk_score"] == 1.0
+
+def test_coerce_fills_missing_nullable_required():
+    out = coerce({"units": "AQI-hours", "total_exposure": 2}, SCHEMA["properties"]["exposure_summary"])
+    assert out["today_exposure"] is None
+    assert out["total_exposure"] == 2
+
+def test_parse_valid_first_pass():
+    so = StructuredOutput(SCHEMA)
+    assert so.parse(json.dumps(_valid())) == _valid()
+    assert so.stats()["valid_first_pass"] == 1
+
+def test_parse_repairs_locally_without_reask():
+    bad = _valid()
+    bad["current_aqi"] = "42"
+    bad["risk_score"] = 3
+    calls = []
+    so = StructuredOutput(SCHEMA)
+    out = so.parse(json.dumps(bad), reask=lambda text, errs: calls.append(errs))
+    assert out["current_aqi"] == 42 and out["risk_score"] == 1
+    assert calls == []
+    assert so.stats()["repaired_locally"] == 1
+
+def test_parse_repairs_by_reask():
+    bad = _valid()
+    del bad["location"]
+    seen = []
+
+    def reask(text, errs):
+        seen.append(errs)
+        return json.dumps(_valid())
+    so = StructuredOutput(SCHEMA)
+    assert so.parse(json.dumps(bad), reask=reask) == _valid()
+    assert len(seen) == 1 and any("location" in e for e in seen[0])
+    stats = so.stats()
+    assert stats["reasks"] == 1 and stats["repaired_by_reask"] == 1
+
+def test_parse_gives_up_after_max_reasks():
+    bad = json.dumps({"location": "Test"})
+    calls = []
+
+    def reask(text, errs):
+        calls.append(text)
+        return bad
+    so = StructuredOutput(SCHEMA, max_reasks=2)
+    with pytest.raises(InvalidOutputError):
+        so.parse(bad, reask=reask)
+    assert len(calls) == 2
+    assert so.stats()["failed"] == 1
+
+def test_parse_invalid_json_without_reask():
+    so = StructuredOutput(SCHEMA)
+    with pytest.raises(InvalidOutputError, match="not valid JSON"):
+        so.parse("not json")
+    assert so.stats()["invalid_json"] == 1
+
+def test_stats_rates():
+    so = StructuredOutput(SCHEMA)
+    so.parse(json.dumps(_valid()))
+    with pytest.raises(InvalidOutputError):
+        so.parse("{}", reask=lambda text, errs: "{}")
+    stats = so.stats()
+    assert stats["calls"] == 2
+    assert stats["validation_failure_rate"] == 0.5
+    assert stats["reask_rate"] == 0.5
+    assert stats["failure_rate"] == 0.5